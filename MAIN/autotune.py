@@ -0,0 +1,107 @@
+import math
+import utime
+
+# Ziegler-Nichols rules: Kp, Ti and Td as factors of the ultimate gain Ku and the ultimate period Pu
+TUNING_RULES = {
+    'classic': (0.6, 0.5, 0.125),
+    'some_overshoot': (0.33, 0.5, 0.33),
+    'no_overshoot': (0.2, 0.5, 0.33),
+}
+
+
+class RelayAutoTune:
+    def __init__(self, setpoint, hysteresis=2, cycles=3, output_span=1.0, rule='no_overshoot', max_overshoot=40):
+        """
+        Relay (Astrom-Hagglund) auto-tuning of the PID.
+        The heater is switched fully on below setpoint - hysteresis and off above setpoint + hysteresis,
+        which makes the oven temp oscillate around the setpoint.  The amplitude and the period of the
+        oscillation give the ultimate gain and period of the oven, and the PID gains are derived from them.
+        :param setpoint: temp in Celsius to oscillate around
+        :param hysteresis: temp in Celsius, keeps the relay from chattering on sensor noise
+        :param cycles: number of oscillations to average, after the first one which is skipped
+        :param output_span: the PID output which means fully on, full_scale of heater_control: the gains are
+            for the time-proportional control, where the PID output is the heater duty
+        :param rule: a key of TUNING_RULES
+        :param max_overshoot: temp in Celsius above the setpoint at which the run is aborted
+        """
+        self.setpoint = setpoint
+        self.hysteresis = hysteresis
+        self.cycles = cycles
+        self.output_span = output_span
+        self.rule = TUNING_RULES.get(rule, TUNING_RULES['no_overshoot'])
+        self.max_overshoot = max_overshoot
+        self.heater_on = True
+        self.highs = []
+        self.lows = []
+        self.switch_off_times = []
+        self.high = None
+        self.low = None
+        self.is_done = False
+        self.error = None
+        self.ultimate_gain = None
+        self.ultimate_period = None
+
+    def update(self, temp, now_ms):
+        """
+        Feed one temp reading, it should be called every control tick
+        :param temp: temp in Celsius
+        :param now_ms: utime.ticks_ms() of the reading
+        :return: bool; whether the heater should be on
+        """
+        if self.is_done:
+            return False
+        if temp > self.setpoint + self.max_overshoot:
+            self.error = 'Too hot'
+            self.is_done = True
+            return False
+        if self.heater_on:
+            if self.low is None or temp < self.low:
+                self.low = temp
+            if temp > self.setpoint + self.hysteresis:
+                self.heater_on = False
+                # the low of the first heating phase is the room temp, skip it
+                if self.switch_off_times:
+                    self.lows.append(self.low)
+                self.switch_off_times.append(now_ms)
+                self.high = None
+        else:
+            if self.high is None or temp > self.high:
+                self.high = temp
+            if temp < self.setpoint - self.hysteresis:
+                self.heater_on = True
+                self.highs.append(self.high)
+                self.low = None
+        if len(self.lows) > self.cycles:
+            self._calc_ultimate()
+            self.is_done = True
+            return False
+        return self.heater_on
+
+    def _calc_ultimate(self):
+        # skip the first oscillation, it starts from the room temp
+        highs = self.highs[-self.cycles:]
+        lows = self.lows[-self.cycles:]
+        times = self.switch_off_times[-self.cycles - 1:]
+        amplitude = (sum(highs) / len(highs) - sum(lows) / len(lows)) / 2
+        period_ms = utime.ticks_diff(times[-1], times[0]) / self.cycles
+        if amplitude <= 0 or period_ms <= 0:
+            self.error = 'No oscillation'
+            return
+        # relay amplitude is half of the output span
+        self.ultimate_gain = 4 * (self.output_span / 2) / (math.pi * amplitude)
+        self.ultimate_period = period_ms / 1000
+
+    def get_gains(self, sampling_hz):
+        """
+        PID gains for PID.update() called sampling_hz times per second:
+        the integration and the derivative of the PID are per tick.
+        :return: tuple of (kp, ki, kd), or None if the run has failed
+        """
+        if self.ultimate_gain is None:
+            return None
+        kp_factor, ti_factor, td_factor = self.rule
+        kp = kp_factor * self.ultimate_gain
+        ti = ti_factor * self.ultimate_period
+        td = td_factor * self.ultimate_period
+        tick = 1 / sampling_hz
+        return kp, kp * tick / ti, kp * td / tick
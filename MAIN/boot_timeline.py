@@ -0,0 +1,42 @@
+import ujson
+import utime
+
+
+class BootTimeline:
+    def __init__(self):
+        """
+        Timestamps of the boot phases, in ms since the reset of the board.
+        mark() is called at the end of each phase, so the time of a phase is the time since the mark before it.
+        """
+        # (phase name, ticks_ms at its end)
+        self.marks = []
+
+    def mark(self, name):
+        """
+        :param name: str; the phase that has just finished
+        """
+        self.marks.append((name, utime.ticks_ms()))
+
+    def get_ready_ms(self):
+        """
+        :return: int; ms from the reset to the last mark
+        """
+        return self.marks[-1][1] if self.marks else 0
+
+    def get_text(self):
+        """
+        :return: str; one line per phase with its duration, for the GUI
+        """
+        lines = ['Ready in {}ms'.format(self.get_ready_ms())]
+        last_ms = 0
+        for name, ms in self.marks:
+            lines.append('{}: {}ms'.format(name, utime.ticks_diff(ms, last_ms)))
+            last_ms = ms
+        return '\n'.join(lines)
+
+    def save(self, path='boot_time.json'):
+        """
+        Save the timeline, to be fetched via FTP
+        """
+        with open(path, 'w') as f:
+            ujson.dump({'marks': self.marks, 'ready_ms': self.get_ready_ms()}, f)
@@ -1,16 +1,15 @@
 import machine
 import utime
-import songs  # song list
-import _thread
-from rtttl import RTTTL  # rtttl parser
+from song_bank import NOTE_SIZE, SongBank  # songs compiled from songs.py
 
 
 class Buzzer:
-    def __init__(self, pin, volume=900):
+    def __init__(self, pin, timer_obj, volume=900):
         """
         Initialize the pwm pin for controlling the buzzer.
         It should be a passive active low piezo buzzer.
         :param pin: int; the pwm pin number
+        :param timer_obj: machine.Timer; times the notes of the song being played
         :param volume: int; the duty cycle of the pwm.  higher the duty cycle, higher the volume of the buzzer
         """
         self.buz = machine.PWM(machine.Pin(pin), duty=0, freq=440)
@@ -45,61 +44,104 @@ class Buzzer:
         self.tone1 = ['A5', 'B5', 'C5', 'B5', 'C5', 'D5', 'C5', 'D5', 'E5', 'D5', 'E5', 'E5']
         self.tone2 = ['G5', 'C5', 'G5', 'C5']
         self.tone3 = ['E5', 0, 'E5', 0, 'E5']
+        # set to True to silence the songs
         self.mute = False
         self.is_playing = False
-        self.song = None
+        self.timer = timer_obj
+        # the song bank is read by preload() at the end of boot, it's not needed to boot
+        self.bank = None
+        # name: (notes, number of notes) of the songs read into RAM by preload()
+        self.songs = {}
+        # the notes of the song being played
+        self.song_buf = None
+        self.note_count = 0
+        self.note_index = 0
+        self.note_gap_ms = 0
+        self.deadline = utime.ticks_ms()
+        # bound once, the timer callbacks are re-armed for every note
+        self._next_note_cb = self._next_note
+        self._note_off_cb = self._note_off
 
-    def play_tone(self, freq, msec):
+    def _start_phase(self, period_ms, callback):
+        # a callback firing before the deadline belongs to a song that has been pre-empted
+        self.deadline = utime.ticks_add(utime.ticks_ms(), period_ms)
+        self.timer.init(period=period_ms, mode=machine.Timer.ONE_SHOT, callback=callback)
+
+    def _is_stale(self):
+        return utime.ticks_diff(utime.ticks_ms(), self.deadline) < 0
+
+    def _next_note(self, t=None):
         """
-        play the tune by its freq and tempo
-        :param freq: int; frequency of the tune
-        :param msec: float; tempo
-        :return: None
+        Start the next note of the song, the note is switched off by the timer
         """
-        # print('freq = {:6.1f} msec = {:6.1f}'.format(freq, msec))
+        if t is not None and self._is_stale():
+            return
+        if self.note_index >= self.note_count:
+            self.stop()
+            return
+        buf = self.song_buf
+        i = self.note_index * NOTE_SIZE
+        freq = buf[i] | buf[i + 1] << 8
+        msec = buf[i + 2] | buf[i + 3] << 8
+        self.note_index += 1
         if freq > 0:
-            self.buz.freq(int(freq))
-            self.buz.duty(int(self.volume))
-        utime.sleep_ms(int(msec * 0.9))
+            self.buz.freq(freq)
+            self.buz.duty(self.volume)
+        on_ms = max(1, msec * 9 // 10)
+        self.note_gap_ms = max(1, msec - on_ms)
+        self._start_phase(on_ms, self._note_off_cb)
+
+    def _note_off(self, t):
+        """
+        Silence the gap after a note, the next note is started by the timer
+        """
+        if self._is_stale():
+            return
         self.buz.duty(0)
-        utime.sleep_ms(int(msec * 0.1))
+        self._start_phase(self.note_gap_ms, self._next_note_cb)
 
-    def play(self, tune):
+    def stop(self):
         """
-        parse the tune to be play
-        :param tune: tuple; the tune of the song
-        :return: None
+        Stop the song being played, if any
         """
-        try:
-            for freq, msec in tune.notes():
-                if not self.mute:
-                    self.is_playing = True
-                    self.play_tone(freq, msec)
-                else:
-                    self.play_tone(0, 0)
-                    self.is_playing = False
-                    self.mute = False
-                    break
-            self.is_playing = False
-            self.mute = False
-        except KeyboardInterrupt:
-            self.play_tone(0, 0)
+        self.timer.deinit()
+        self.buz.duty(0)
+        self.note_count = 0
+        self.is_playing = False
+
+    def _load_bank(self):
+        if self.bank is None:
+            # compiles songs.bin if it's out of date
+            self.bank = SongBank()
 
-    def play_song(self, search):
+    def preload(self, songs):
         """
-        play a song stored in songs.py
-        :param search: string; song name listed in songs.py
-        :return: None
+        Read the song bank and the notes of the given songs into RAM, so that playing them doesn't touch the flash.
+        Call it once the GUI is up, for the songs played by the control loop.
+        :param songs: list of song names listed in songs.py
         """
-        while self.is_playing:
-            self.mute = True
-        else:
-            self.mute = False
-        # play song in a new thread (non-blocking)
-        # _thread.stack_size(16 * 1024)  # set stack size to avoid runtime error
-        # play_tone = _thread.start_new_thread(self.play, (RTTTL(songs.find(search)),))
-        self.play(RTTTL(songs.find(search)))
-        self.song = None
+        self._load_bank()
+        for song in songs:
+            entry = self.bank.index.get(song)
+            if entry and song not in self.songs:
+                buf = bytearray(entry[1] * NOTE_SIZE)
+                self.songs[song] = (buf, self.bank.load(song, buf))
 
     def activate(self, song):
-        self.song = song
+        """
+        Play a song stored in songs.py without blocking: each note is timed by a one-shot timer.
+        A song being played is cut off by the new one.  A song not preloaded is read from flash here.
+        :param song: string; song name listed in songs.py
+        """
+        self.stop()
+        if self.mute:
+            return
+        if song in self.songs:
+            self.song_buf, self.note_count = self.songs[song]
+        else:
+            self._load_bank()
+            self.song_buf = bytearray(self.bank.max_notes * NOTE_SIZE)
+            self.note_count = self.bank.load(song, self.song_buf)
+        self.note_index = 0
+        self.is_playing = True
+        self._next_note()
@@ -0,0 +1,70 @@
+import machine
+import micropython
+import utime
+
+
+class ControlTask:
+    def __init__(self, timer_obj, period_ms, task, stats_obj=None):
+        """
+        Run the control work periodically, outside of the timer interrupt.
+        The timer callback only posts a tick with micropython.schedule, the task itself runs in task context
+        where it may allocate, format strings and call LVGL.
+        :param timer_obj: machine.Timer
+        :param period_ms: int; period of the control loop, it's also the time budget of one tick
+        :param task: callable without arguments, called once per tick
+        :param stats_obj: LoopStats, records the latency, jitter and execution time of every tick
+        """
+        self.tim = timer_obj
+        self.period_ms = period_ms
+        self.budget_us = period_ms * 1000
+        self.task = task
+        self.stats = stats_obj
+        self.is_running = False
+        self.is_pending = False
+        # ticks which took longer than period_ms
+        self.overruns = 0
+        # ticks dropped, as the previous tick hadn't been run yet
+        self.missed = 0
+        self.last_run_us = 0
+        self.posted_us = 0
+        # bound once, so posting a tick doesn't allocate in the interrupt
+        self._tick_cb = self._post_tick
+        self._run_cb = self._run
+
+    def start(self):
+        self.overruns = 0
+        self.missed = 0
+        self.is_pending = False
+        if self.stats:
+            self.stats.reset()
+        self.is_running = True
+        self.tim.init(period=self.period_ms, mode=machine.Timer.PERIODIC, callback=self._tick_cb)
+
+    def stop(self):
+        self.is_running = False
+        self.tim.deinit()
+
+    def _post_tick(self, t):
+        if self.is_pending:
+            self.missed += 1
+            return
+        self.posted_us = utime.ticks_us()
+        self.is_pending = True
+        try:
+            micropython.schedule(self._run_cb, None)
+        except RuntimeError:
+            # schedule queue is full
+            self.is_pending = False
+            self.missed += 1
+
+    def _run(self, _):
+        self.is_pending = False
+        if not self.is_running:
+            return
+        start = utime.ticks_us()
+        self.task()
+        self.last_run_us = utime.ticks_diff(utime.ticks_us(), start)
+        if self.last_run_us > self.budget_us:
+            self.overruns += 1
+        if self.stats:
+            self.stats.record(self.posted_us, start, self.last_run_us)
@@ -1,7 +1,7 @@
 import machine
-import ujson
 import uos
 import utime
+from uarray import array
 
 import lvgl as lv
 import lvesp32
@@ -11,10 +11,23 @@ class GUI:
     CHART_WIDTH = 240
     CHART_HEIGHT = 120
     CHART_TOP_PADDING = 10
-
-    def __init__(self, profiles_obj, config_dict, pid_obj, sensor_obj):
+    # the queued updates are applied once per frame, LV_DISP_DEF_REFR_PERIOD
+    FRAME_MS = 30
+    # size of the queue of chart points, and the most of them drawn in one frame
+    CHART_QUEUE_SIZE = 16
+    CHART_POINTS_PER_FRAME = 4
+    # slots of the update queue, only the latest value of each is applied
+    SLOT_TEMP = 0
+    SLOT_TIMER = 1
+    SLOT_STAGE = 2
+    SLOT_LED = 3
+    SLOT_PROCESS_OFF = 4
+    SLOT_AUTOTUNE_RESULT = 5
+
+    def __init__(self, profiles_obj, settings_obj, pid_obj, sensor_obj):
         self.profiles = profiles_obj
-        self.config = config_dict
+        self.settings = settings_obj
+        self.config = settings_obj.data
         self.pid = pid_obj
         self.sensor = sensor_obj
         self.pid_params = self.config.get('pid')
@@ -22,8 +35,18 @@ class GUI:
         self.alloy_list = self.profiles.get_profile_alloy_names()
         self.has_started = False
         self.main_scr = lv.obj()
+        # the dimmed background of the popups, shared by all of them
+        self.modal_style = lv.style_t()
+        lv.style_copy(self.modal_style, lv.style_plain_color)
+        self.modal_style.body.main_color = self.modal_style.body.grad_color = lv.color_make(0, 0, 0)
+        self.modal_style.body.opa = lv.OPA._50
+        # The popups opened often are built on first use, then hidden when closed and shown again, rather than
+        # rebuilt every time
+        self.settings_popup = None
+        self.text_popup = None
+        self.pid_popup = None
         self.oven_title = self.oven_title_init()
-        self.chart, self.chart_series = self.chart_init()
+        self.chart, self.chart_max_series, self.chart_min_series = self.chart_init()
         self.profile_title_label, self.profile_title_cont, self.profile_title_text = self.profile_title_init()
         self.timer_label, self.timer_cont, self.timer_text = self.timer_init()
         self.profile_alloy_selector = self.profile_selector_init()
@@ -32,17 +55,94 @@ class GUI:
         self.settings_btn = self.settings_btn_init()
         self.temp_text = self.temp_init()
         self.led = self.led_init()
+        # the profile line and the melting temp line are built once, then moved to the selected profile
         self.line = None
         self.dashed_line = None
+        self.melt_label = None
+        # number of temp points of a reflow process, one per second
         self.point_count = None
-        self.chart_point_list = None
+        # number of columns of the chart series, the points are decimated to at most one column per pixel
+        self.chart_columns = None
+        # index of the next temp point, and the min/max of the temp points of the current column
+        self.chart_point_index = 0
+        self.column_min = 0
+        self.column_max = 0
+        # The update queue: any thread or timer may post, only the LVGL task applies, once per frame.
+        # A producer writes the value, then flags its slot; the LVGL task clears the flag, then reads the value,
+        # so an update posted meanwhile is at worst applied twice, never lost.  No lock is needed.
+        self.slot_values = [None] * 6
+        self.slot_pending = bytearray(6)
+        # the value last shown by the widget of each slot, an update to the same value isn't sent to the display
+        self.slot_shown = [None] * 6
+        self.slot_shown[GUI.SLOT_TIMER] = 0
+        self.updates_applied = 0
+        self.updates_suppressed = 0
+        self.slot_appliers = (
+            self._show_temp,
+            self._show_timer_text,
+            self._show_stage_text,
+            self._show_led,
+            self._process_off,
+            self._show_autotune_result,
+        )
+        # chart points posted by the control loop, written and read by one side each
+        self.chart_queue = array('h', [0] * GUI.CHART_QUEUE_SIZE)
+        self.chart_posted = 0
+        self.chart_drawn = 0
         self.profile_detail_init()
         self.profile_alloy_selector.move_foreground()
         self.show_set_btn_hide_stage()
         self.reflow_process_start_cb = None
         self.reflow_process_stop_cb = None
+        self.loop_stats_cb = None
+        self.boot_timeline_cb = None
+        self.autotune_start_cb = None
         self.current_input_placeholder = 'Set Kp'
         lv.scr_load(self.main_scr)
+        self.update_task = lv.task_create(self._update_task_cb, GUI.FRAME_MS, lv.TASK_PRIO.MID, None)
+
+    def _post(self, slot, value):
+        self.slot_values[slot] = value
+        self.slot_pending[slot] = 1
+
+    def _changed(self, slot, value):
+        """
+        Whether value differs from what the widget of the slot shows, which is then set to value
+        """
+        if value == self.slot_shown[slot]:
+            self.updates_suppressed += 1
+            return False
+        self.slot_shown[slot] = value
+        self.updates_applied += 1
+        return True
+
+    def get_update_stats_text(self):
+        """
+        Updates of the widgets sent to the display, and those skipped as they showed the value already
+        """
+        return 'GUI updates: {}  Skipped: {}'.format(self.updates_applied, self.updates_suppressed)
+
+    def _update_task_cb(self, task):
+        self.process_updates()
+
+    def process_updates(self):
+        """
+        Apply the updates posted since the last frame, run by the LVGL task
+        """
+        pending = self.slot_pending
+        for slot in range(len(pending)):
+            if pending[slot]:
+                pending[slot] = 0
+                self.slot_appliers[slot](self.slot_values[slot])
+        posted = self.chart_posted
+        if posted - self.chart_drawn > GUI.CHART_QUEUE_SIZE:
+            # the oldest points have been overwritten
+            self.chart_drawn = posted - GUI.CHART_QUEUE_SIZE
+        count = 0
+        while self.chart_drawn < posted and count < GUI.CHART_POINTS_PER_FRAME:
+            self._add_chart_point(self.chart_queue[self.chart_drawn % GUI.CHART_QUEUE_SIZE])
+            self.chart_drawn += 1
+            count += 1
 
     def profile_detail_init(self):
         """
@@ -61,9 +161,11 @@ class GUI:
             GUI.CHART_TOP_PADDING,
         )
         if self.line:
-            lv.obj.delete(self.line)
-            self.line = None
-        self.line = self.draw_profile_line(self.profile_chart_points)
+            self.line.set_points(self.profile_chart_points, len(self.profile_chart_points))
+            # the line is auto sized, a profile of another height moves it off the bottom of the chart
+            self.line.align(self.chart, lv.ALIGN.IN_BOTTOM_MID, 0, 0)
+        else:
+            self.line = self.draw_profile_line(self.profile_chart_points)
         # Draw melting temp in dashed line
         chart_melting_y_point = self.profiles.get_chart_melting_y_point(
             GUI.CHART_WIDTH,
@@ -71,24 +173,16 @@ class GUI:
             GUI.CHART_TOP_PADDING,
         )
         melting_temp = self.profiles.get_melting_temp()
-        if self.dashed_line:
-            lv.obj.delete(self.dashed_line)
-            self.dashed_line = None
-        self.dashed_line = self.draw_melting_dash_line(chart_melting_y_point, melting_temp)
+        if not self.dashed_line:
+            self.dashed_line, self.melt_label = self.draw_melting_dash_line()
+        self.move_melting_dash_line(chart_melting_y_point, melting_temp)
         # Update chart settings
         temp_range = self.profiles.get_temp_range()
         self.chart.set_range(temp_range[0], temp_range[-1] + GUI.CHART_TOP_PADDING)  # min, max temp in the chart
         self.point_count = self.profiles.get_chart_point_count()
-        self.chart.set_point_count(self.point_count)
-        self.chart_point_list = self.null_chart_list
-
-    @property
-    def null_chart_list(self):
-        """
-        Generate a null list for the chart
-        :return: List
-        """
-        return [lv.CHART_POINT.DEF] * self.point_count
+        self.chart_columns = min(self.point_count, GUI.CHART_WIDTH)
+        self.chart.set_point_count(self.chart_columns)
+        self.chart_clear()
 
     def chart_init(self):
         """
@@ -98,27 +192,57 @@ class GUI:
         chart.set_size(GUI.CHART_WIDTH, GUI.CHART_HEIGHT)  # width, height pixel of the chart
         chart.align(lv.scr_act(), lv.ALIGN.IN_BOTTOM_MID, 0, 0)
         chart.set_type(lv.chart.TYPE.LINE)
+        # new points are written in place from left to right rather than shifting the series
+        chart.set_update_mode(lv.chart.UPDATE_MODE.CIRCULAR)
         chart.set_style(lv.chart.STYLE.MAIN, lv.style_plain)
         chart.set_series_opa(lv.OPA.COVER)
         chart.set_series_width(3)
-        chart_series = chart.add_series(lv.color_make(0xFF, 0, 0))
-        return chart, chart_series
+        # the max and the min of each column, drawn in the same color so that peaks show up
+        chart_max_series = chart.add_series(lv.color_make(0xFF, 0, 0))
+        chart_min_series = chart.add_series(lv.color_make(0xFF, 0, 0))
+        return chart, chart_max_series, chart_min_series
 
     def chart_clear(self):
         """
-        Clear the chart with null points
-        """
-        self.chart_point_list = self.null_chart_list
-        self.chart.set_points(self.chart_series, self.chart_point_list)
-
-    def chart_update(self, temp_list):
-        """
-        Update chart data, should be called every 1s
-        :param temp_list: list of actual temp with increasing length - new point appended to the tail
-        """
-        list_length = len(temp_list)
-        self.chart_point_list[:list_length] = temp_list
-        self.chart.set_points(self.chart_series, self.chart_point_list)
+        Clear the chart with null points, the next point goes to the left end
+        """
+        self.chart.init_points(self.chart_max_series, lv.CHART_POINT.DEF)
+        self.chart.init_points(self.chart_min_series, lv.CHART_POINT.DEF)
+        # the points still queued belong to the previous process
+        self.chart_drawn = self.chart_posted
+        self.chart_point_index = 0
+        self.column_min = 32767
+        self.column_max = -32768
+
+    def chart_update(self, temp):
+        """
+        Add a temp point to the chart, should be called every 1s.  It's queued and drawn by the LVGL task.
+        :param temp: int; actual temp
+        """
+        posted = self.chart_posted
+        self.chart_queue[posted % GUI.CHART_QUEUE_SIZE] = temp
+        self.chart_posted = posted + 1
+
+    def _add_chart_point(self, temp):
+        """
+        The points are decimated to the columns of the chart keeping the min and the max of each column,
+        and only a finished column is written, so the cost doesn't grow with the length of the process.
+        :param temp: int; actual temp
+        """
+        i = self.chart_point_index
+        if i >= self.point_count:
+            return
+        self.chart_point_index = i + 1
+        if temp < self.column_min:
+            self.column_min = temp
+        if temp > self.column_max:
+            self.column_max = temp
+        # the column is finished when the next point falls in the next column
+        if (i + 1) * self.chart_columns // self.point_count != i * self.chart_columns // self.point_count:
+            self.chart.set_next(self.chart_max_series, self.column_max)
+            self.chart.set_next(self.chart_min_series, self.column_min)
+            self.column_min = 32767
+            self.column_max = -32768
 
     def draw_profile_line(self, points):
         """
@@ -137,9 +261,10 @@ class GUI:
         line.set_y_invert(True)
         return line
 
-    def draw_melting_dash_line(self, y_point, melting_temp):
+    def draw_melting_dash_line(self):
         """
-        Draw melting temp with dashed line over the chart
+        Draw melting temp with dashed line over the chart, placed by move_melting_dash_line()
+        :return: the container of the line, the label of the melting temp
         """
         # Container for dashed line
         style_cont = lv.style_t()
@@ -170,11 +295,15 @@ class GUI:
         # Melting temp
         melt_label = lv.label(dashed_cont)
         melt_label.set_recolor(True)
-        melt_label.set_text('#FF6833 ' + str(melting_temp) + '#')
-        # Put above elements in place
-        dashed_cont.align_origo(self.chart, lv.ALIGN.IN_BOTTOM_MID, 0, -y_point)
-        melt_label.align(dashed_cont, lv.ALIGN.IN_TOP_LEFT, 8, 12)
-        return dashed_cont
+        return dashed_cont, melt_label
+
+    def move_melting_dash_line(self, y_point, melting_temp):
+        """
+        Put the melting temp line at the melting temp of the selected profile
+        """
+        self.melt_label.set_text('#FF6833 ' + str(melting_temp) + '#')
+        self.dashed_line.align_origo(self.chart, lv.ALIGN.IN_BOTTOM_MID, 0, -y_point)
+        self.melt_label.align(self.dashed_line, lv.ALIGN.IN_TOP_LEFT, 8, 12)
 
     def led_init(self):
         """
@@ -201,14 +330,22 @@ class GUI:
         Turn on the LED to indicate heating
         Should be called externally
         """
-        self.led.on()
+        self._post(GUI.SLOT_LED, True)
 
     def led_turn_off(self):
         """
         Turn off the LED to indicate not heating
         Should be called externally
         """
-        self.led.off()
+        self._post(GUI.SLOT_LED, False)
+
+    def _show_led(self, is_on):
+        if not self._changed(GUI.SLOT_LED, is_on):
+            return
+        if is_on:
+            self.led.on()
+        else:
+            self.led.off()
 
     def oven_title_init(self):
         """
@@ -298,12 +435,8 @@ class GUI:
 
     def save_default_alloy(self):
         alloy_name = self.alloy_list[self.profile_alloy_selector.get_selected()]
-        # with open('config.json', 'r') as f:
-        #     data = ujson.load(f)
-        # data['default_alloy'] = alloy_name
-        self.config['default_alloy'] = alloy_name
-        with open('config.json', 'w') as f:
-            ujson.dump(self.config, f)
+        # written to config.json by the settings store, off the UI thread
+        self.settings.set('default_alloy', alloy_name)
 
     def timer_init(self):
         """
@@ -325,8 +458,13 @@ class GUI:
         """
         Update the timer with the elapsed time
         Should be called externally
+        :param time: int; elapsed seconds, shown as mm:ss
         """
-        self.timer_text.set_text(str(time))
+        self._post(GUI.SLOT_TIMER, time)
+
+    def _show_timer_text(self, time):
+        if self._changed(GUI.SLOT_TIMER, time):
+            self.timer_text.set_text('{:02d}:{:02d}'.format(time // 60, time % 60))
 
     def temp_init(self):
         """
@@ -349,24 +487,38 @@ class GUI:
         Update the actual real-time temp
         Should be called externally
         """
+        self._post(GUI.SLOT_TEMP, temp)
+
+    def _show_temp(self, temp):
         try:
             float(temp)
             temp = '{:.1f}'.format(temp)
         except ValueError:
             pass
-        finally:
+        # the temp is compared as shown, to the tenth of a degree
+        if self._changed(GUI.SLOT_TEMP, temp):
             self.temp_text.set_text(temp)
 
-    def popup_confirm_stop(self):
-        modal_style = lv.style_t()
-        lv.style_copy(modal_style, lv.style_plain_color)
-        modal_style.body.main_color = modal_style.body.grad_color = lv.color_make(0, 0, 0)
-        modal_style.body.opa = lv.OPA._50
+    def _modal_bg(self):
+        """
+        The dimmed full screen background of a popup, the popup is its child
+        """
         bg = lv.obj(self.main_scr)
-        bg.set_style(modal_style)
+        bg.set_style(self.modal_style)
         bg.set_pos(0, 0)
         bg.set_size(self.main_scr.get_width(), self.main_scr.get_height())
         bg.set_opa_scale_enable(True)
+        return bg
+
+    def _show_popup(self, bg):
+        """
+        Show a hidden popup again, on top of anything created since
+        """
+        bg.set_hidden(False)
+        bg.move_foreground()
+
+    def popup_confirm_stop(self):
+        bg = self._modal_bg()
 
         popup_stop = lv.mbox(bg)
         popup_stop.set_text('Do you really want to stop the soldering process?')
@@ -388,19 +540,15 @@ class GUI:
         popup_stop.align(None, lv.ALIGN.CENTER, 0, 0)
 
     def popup_settings(self):
-        modal_style = lv.style_t()
-        lv.style_copy(modal_style, lv.style_plain_color)
-        modal_style.body.main_color = modal_style.body.grad_color = lv.color_make(0, 0, 0)
-        modal_style.body.opa = lv.OPA._50
-        bg = lv.obj(self.main_scr)
-        bg.set_style(modal_style)
-        bg.set_pos(0, 0)
-        bg.set_size(self.main_scr.get_width(), self.main_scr.get_height())
-        bg.set_opa_scale_enable(True)
+        if self.settings_popup:
+            self._show_popup(self.settings_popup)
+            return
+        bg = self._modal_bg()
+        self.settings_popup = bg
 
         popup_settings = lv.mbox(bg)
         popup_settings.set_text('Settings')
-        btns = ['Set PID Params', '\n', 'Calibrate Touch', '\n', 'Close', '']
+        btns = ['Set PID Params', 'Auto-Tune', '\n', 'Calibrate Touch', 'Boot Time', '\n', 'Loop Stats', 'Close', '']
         popup_settings.add_btns(btns)
 
         lv.cont.set_fit(popup_settings, lv.FIT.NONE)
@@ -427,27 +575,79 @@ class GUI:
                     tim.init(period=500, mode=machine.Timer.ONE_SHOT, callback=lambda t: machine.reset())
                 elif active_btn_text == 'Set PID Params':
                     tim.init(period=50, mode=machine.Timer.ONE_SHOT, callback=lambda t: self.popup_pid_params())
+                elif active_btn_text == 'Auto-Tune':
+                    tim.init(period=50, mode=machine.Timer.ONE_SHOT, callback=lambda t: self.popup_confirm_autotune())
+                elif active_btn_text == 'Loop Stats':
+                    tim.init(period=50, mode=machine.Timer.ONE_SHOT, callback=lambda t: self.popup_loop_stats())
+                elif active_btn_text == 'Boot Time':
+                    tim.init(period=50, mode=machine.Timer.ONE_SHOT, callback=lambda t: self.popup_boot_timeline())
                 else:
                     tim.deinit()
-                bg.del_async()
-                popup_settings.start_auto_close(5)
+                bg.set_hidden(True)
 
         popup_settings.set_event_cb(event_handler)
         popup_settings.align(None, lv.ALIGN.CENTER, 0, 0)
 
+    def popup_loop_stats(self):
+        """
+        The popup window of the control loop timing
+        """
+        text = self.loop_stats_cb() if self.loop_stats_cb else 'No loop stats yet.'
+        self.popup_text(text + '\n' + self.get_update_stats_text())
+
+    def popup_boot_timeline(self):
+        """
+        The popup window of the time taken by each phase of the boot
+        """
+        self.popup_text(self.boot_timeline_cb() if self.boot_timeline_cb else 'No boot timeline.')
+
+    def popup_text(self, text):
+        """
+        A popup window showing some text, with a Close button
+        :param text: str
+        """
+        if self.text_popup:
+            bg, popup_text = self.text_popup
+            self._show_popup(bg)
+        else:
+            bg = self._modal_bg()
+            popup_text = lv.mbox(bg)
+            btns = ['Close', '']
+            popup_text.add_btns(btns)
+
+            def event_handler(obj, event):
+                if event == lv.EVENT.VALUE_CHANGED:
+                    bg.set_hidden(True)
+
+            popup_text.set_event_cb(event_handler)
+            self.text_popup = (bg, popup_text)
+        popup_text.set_text(text)
+        popup_text.align(None, lv.ALIGN.CENTER, 0, 0)
+
     def popup_pid_params(self):
         """
-        The popup window of PID params settings
+        The popup window of PID params settings, showing the params in use
         """
-        modal_style = lv.style_t()
-        lv.style_copy(modal_style, lv.style_plain_color)
-        modal_style.body.main_color = modal_style.body.grad_color = lv.color_make(0, 0, 0)
-        modal_style.body.opa = lv.OPA._50
-        bg = lv.obj(self.main_scr)
-        bg.set_style(modal_style)
-        bg.set_pos(0, 0)
-        bg.set_size(self.main_scr.get_width(), self.main_scr.get_height())
-        bg.set_opa_scale_enable(True)
+        if self.pid_popup:
+            self._show_popup(self.pid_popup[0])
+        else:
+            self.pid_popup = self._pid_popup_init()
+        bg, popup_pid, kb, inputs = self.pid_popup
+        kp_input, ki_input, kd_input, temp_offset_input = inputs
+        kp_input.set_text(str(self.pid_params.get('kp')))
+        ki_input.set_text(str(self.pid_params.get('ki')))
+        kd_input.set_text(str(self.pid_params.get('kd')))
+        temp_offset_input.set_text(str(self.temp_offset))
+        popup_pid.align(bg, lv.ALIGN.CENTER, 0, 0)
+        kb.set_ta(kp_input)
+        kb.set_hidden(True)
+
+    def _pid_popup_init(self):
+        """
+        Build the popup window of PID params settings, once
+        :return: the background, the mbox, the keyboard, and the text areas of kp, ki, kd and the temp offset
+        """
+        bg = self._modal_bg()
 
         # init mbox and title
         popup_pid = lv.mbox(bg)
@@ -496,7 +696,6 @@ class GUI:
 
         # init text areas
         kp_input = lv.ta(input_cont)
-        kp_input.set_text(str(self.pid_params.get('kp')))
         kp_input.set_placeholder_text('Set Kp')
         kp_input.set_accepted_chars('0123456789.+-')
         kp_input.set_one_line(True)
@@ -511,7 +710,6 @@ class GUI:
         pid_title_label.align(kp_input, lv.ALIGN.OUT_TOP_LEFT, -65, 0)
 
         ki_input = lv.ta(input_cont)
-        ki_input.set_text(str(self.pid_params.get('ki')))
         ki_input.set_placeholder_text('Set Ki')
         ki_input.set_accepted_chars('0123456789.+-')
         ki_input.set_one_line(True)
@@ -524,7 +722,6 @@ class GUI:
         ki_label.align(ki_input, lv.ALIGN.OUT_LEFT_MID, 0, 0)
 
         kd_input = lv.ta(input_cont)
-        kd_input.set_text(str(self.pid_params.get('kd')))
         kd_input.set_placeholder_text('Set Kd')
         kd_input.set_accepted_chars('0123456789.+-')
         kd_input.set_one_line(True)
@@ -537,7 +734,6 @@ class GUI:
         kd_label.align(kd_input, lv.ALIGN.OUT_LEFT_MID, 0, 0)
 
         temp_offset_input = lv.ta(input_cont)
-        temp_offset_input.set_text(str(self.temp_offset))
         temp_offset_input.set_placeholder_text('Set Offset')
         temp_offset_input.set_accepted_chars('0123456789.+-')
         temp_offset_input.set_one_line(True)
@@ -572,27 +768,80 @@ class GUI:
                     ki_value = float(ki_input.get_text())
                     kd_value = float(kd_input.get_text())
                     temp_offset_value = float(temp_offset_input.get_text())
-                    self.config['pid'] = {
-                        'kp': kp_value,
-                        'ki': ki_value,
-                        'kd': kd_value
-                    }
-                    self.config['sensor_offset'] = temp_offset_value
-                    self.pid_params = self.config.get('pid')
-                    self.temp_offset = self.config.get('sensor_offset')
-                    # Save settings to config.json
-                    with open('config.json', 'w') as f:
-                        ujson.dump(self.config, f)
-                    # Apply settings immediately
-                    self.pid.reset(kp_value, ki_value, kd_value)
-                    self.sensor.set_offset(temp_offset_value)
-                bg.del_async()
-                popup_pid.start_auto_close(5)
+                    self.save_pid_params(kp_value, ki_value, kd_value, temp_offset_value)
+                bg.set_hidden(True)
 
         popup_pid.set_event_cb(event_handler)
-        popup_pid.align(bg, lv.ALIGN.CENTER, 0, 0)
-        kb.set_ta(kp_input)
-        kb.set_hidden(True)
+        return bg, popup_pid, kb, (kp_input, ki_input, kd_input, temp_offset_input)
+
+    def save_pid_params(self, kp, ki, kd, temp_offset):
+        """
+        Save the PID params and the temp correction to config.json, and apply them immediately
+        """
+        self.settings.set('pid', {
+            'kp': kp,
+            'ki': ki,
+            'kd': kd
+        })
+        self.settings.set('sensor_offset', temp_offset)
+        self.pid_params = self.config.get('pid')
+        self.temp_offset = self.config.get('sensor_offset')
+        # Apply settings immediately
+        self.pid.reset(kp, ki, kd)
+        self.sensor.set_offset(temp_offset)
+
+    def popup_confirm_autotune(self):
+        """
+        The popup window to confirm the PID auto-tuning, the oven heats up during the tuning.
+        The tuned gains only fit the time_proportional heater mode, it's refused in the on_off mode.
+        """
+        if self.config.get('heater_control', {}).get('mode') != 'time_proportional':
+            self.popup_autotune_result(None, 'needs the time_proportional heater mode')
+            return
+        bg = self._modal_bg()
+
+        popup_autotune = lv.mbox(bg)
+        popup_autotune.set_text('The oven will heat up to around {}`C to tune the PID, continue?'.format(
+            self.config.get('autotune', {}).get('setpoint', 150)))
+        btns = ['OK', 'Cancel', '']
+        popup_autotune.add_btns(btns)
+
+        def event_handler(obj, event):
+            if event == lv.EVENT.VALUE_CHANGED:
+                if popup_autotune.get_active_btn() == 0:
+                    self.set_autotune_on()
+                bg.del_async()
+                popup_autotune.start_auto_close(5)
+
+        popup_autotune.set_event_cb(event_handler)
+        popup_autotune.align(None, lv.ALIGN.CENTER, 0, 0)
+
+    def popup_autotune_result(self, gains, error=None):
+        """
+        The popup window of the auto-tuned PID params, should be called externally
+        :param gains: tuple of (kp, ki, kd), or None if the tuning has failed
+        :param error: str; why the tuning has failed
+        """
+        bg = self._modal_bg()
+
+        popup_result = lv.mbox(bg)
+        if gains:
+            popup_result.set_text('Auto-Tune done\nKp: {:.4g}\nKi: {:.4g}\nKd: {:.4g}\nSave the PID params?'.format(*gains))
+            btns = ['Save', 'Cancel', '']
+        else:
+            popup_result.set_text('Auto-Tune failed: {}'.format(error))
+            btns = ['Close', '']
+        popup_result.add_btns(btns)
+
+        def event_handler(obj, event):
+            if event == lv.EVENT.VALUE_CHANGED:
+                if popup_result.get_active_btn_text() == 'Save':
+                    self.save_pid_params(gains[0], gains[1], gains[2], self.temp_offset)
+                bg.del_async()
+                popup_result.start_auto_close(5)
+
+        popup_result.set_event_cb(event_handler)
+        popup_result.align(None, lv.ALIGN.CENTER, 0, 0)
 
     def start_btn_init(self):
         """
@@ -674,7 +923,11 @@ class GUI:
         Update the stage info to let user know which stage of the reflow is going now.
         Should be called externally
         """
-        self.stage_label.set_text(text)
+        self._post(GUI.SLOT_STAGE, text)
+
+    def _show_stage_text(self, text):
+        if self._changed(GUI.SLOT_STAGE, text):
+            self.stage_label.set_text(text)
 
     def show_stage_hide_set_btn(self):
         """
@@ -696,6 +949,44 @@ class GUI:
     def add_reflow_process_stop_cb(self, stop_cb):
         self.reflow_process_stop_cb = stop_cb
 
+    def add_loop_stats_cb(self, stats_cb):
+        self.loop_stats_cb = stats_cb
+
+    def add_boot_timeline_cb(self, timeline_cb):
+        self.boot_timeline_cb = timeline_cb
+
+    def add_autotune_start_cb(self, start_cb):
+        self.autotune_start_cb = start_cb
+
+    def set_autotune_on(self):
+        """
+        Start the PID auto-tuning, it is stopped by the Stop button like the reflow process
+        """
+        self.has_started = True
+        self.set_start_btn_to_stop()
+        self.disable_alloy_selector(True)
+        self.show_stage_hide_set_btn()
+        if self.autotune_start_cb:
+            self.autotune_start_cb()
+
+    def post_reflow_process_off(self):
+        """
+        Same as set_reflow_process_on(False), from outside the LVGL task, e.g. by the control loop
+        """
+        self._post(GUI.SLOT_PROCESS_OFF, None)
+
+    def _process_off(self, value):
+        self.set_reflow_process_on(False)
+
+    def post_autotune_result(self, gains, error=None):
+        """
+        Same as popup_autotune_result(), from outside the LVGL task
+        """
+        self._post(GUI.SLOT_AUTOTUNE_RESULT, (gains, error))
+
+    def _show_autotune_result(self, result):
+        self.popup_autotune_result(*result)
+
     def set_reflow_process_on(self, is_on):
         if is_on:
             self.has_started = is_on
@@ -0,0 +1,169 @@
+import machine
+import micropython
+import utime
+
+
+class Heater:
+    def __init__(self, signal_obj, on_change=None):
+        """
+        Drive the heater SSR.  Only an actual on/off transition touches the pin,
+        so keeping the heater in the same state is nearly free.
+        :param signal_obj: machine.Signal of the heater pin
+        :param on_change: callable(is_on), deferred with micropython.schedule after every switch,
+            e.g. to refresh the LED on the GUI
+        """
+        self.signal = signal_obj
+        self.on_change = on_change
+        self.is_on = False
+        self.notify_pending = False
+        self.switch_count = 0
+        self.on_ms = 0
+        self.off_ms = 0
+        self.last_switch = utime.ticks_ms()
+        # bound once, so scheduling the notification doesn't allocate
+        self._notify_cb = self._notify
+        self.signal.off()
+
+    def set(self, is_on):
+        """
+        Switch the heater on or off
+        :param is_on: bool
+        :return: True if the heater has switched, False if it was already in that state
+        """
+        if is_on == self.is_on:
+            if self.notify_pending:
+                self._post_notify()
+            return False
+        now = utime.ticks_ms()
+        if self.is_on:
+            self.on_ms += utime.ticks_diff(now, self.last_switch)
+        else:
+            self.off_ms += utime.ticks_diff(now, self.last_switch)
+        self.last_switch = now
+        self.is_on = is_on
+        self.switch_count += 1
+        if is_on:
+            self.signal.on()
+        else:
+            self.signal.off()
+        if self.on_change:
+            self._post_notify()
+        return True
+
+    def _post_notify(self):
+        try:
+            micropython.schedule(self._notify_cb, None)
+            self.notify_pending = False
+        except RuntimeError:
+            # schedule queue is full, try again on the next call of set()
+            self.notify_pending = True
+
+    def _notify(self, _):
+        self.on_change(self.is_on)
+
+    def reset_stats(self):
+        """
+        Clear the switch counter and the on/off time, e.g. when a new reflow process starts
+        """
+        self.switch_count = 0
+        self.on_ms = 0
+        self.off_ms = 0
+        self.last_switch = utime.ticks_ms()
+
+    def get_stats(self):
+        """
+        :return: tuple of (switch count, ms spent on, ms spent off), the current on/off period included
+        """
+        elapsed = utime.ticks_diff(utime.ticks_ms(), self.last_switch)
+        if self.is_on:
+            return self.switch_count, self.on_ms + elapsed, self.off_ms
+        return self.switch_count, self.on_ms, self.off_ms + elapsed
+
+
+class HeaterPWM:
+    def __init__(self, heater_obj, window_timer, edge_timer, window_ms=2000, min_switch_ms=20):
+        """
+        Time-proportional (windowed PWM) control of the heater.
+        Within every window the heater is on for duty * window_ms, then off.
+        The switch-off edge has its own one-shot timer, so it doesn't wait for the next control tick.
+        :param heater_obj: Heater
+        :param window_timer: machine.Timer which starts every window
+        :param edge_timer: machine.Timer which switches the heater off within a window
+        :param window_ms: int; length of the PWM window
+        :param min_switch_ms: int; shorter on or off pulses are dropped, which protects the SSR and
+            respects its zero-crossing switching
+        """
+        self.heater = heater_obj
+        self.window_tim = window_timer
+        self.edge_tim = edge_timer
+        self.window_ms = window_ms
+        self.min_switch_ms = min_switch_ms
+        self.on_ms = 0
+        self.window_start = 0
+        self.is_running = False
+        # bound once, so the timer callbacks don't allocate
+        self._window_cb = self._start_window
+        self._edge_cb = self._edge
+
+    def start(self):
+        """
+        Start the PWM windows with the heater off
+        """
+        self.on_ms = 0
+        self.is_running = True
+        self.window_tim.init(period=self.window_ms, mode=machine.Timer.PERIODIC, callback=self._window_cb)
+        self._start_window(None)
+
+    def stop(self):
+        """
+        Stop the PWM windows and switch off the heater
+        """
+        self.is_running = False
+        self.window_tim.deinit()
+        self.edge_tim.deinit()
+        self.on_ms = 0
+        self.heater.set(False)
+
+    def set_duty(self, duty):
+        """
+        Set the fraction of each window the heater is on.
+        A change applies to the current window straight away.
+        :param duty: float; 0 to 1, values out of the range are clamped
+        """
+        self.set_on_ms(int(duty * self.window_ms))
+
+    def set_on_ms(self, on_ms):
+        """
+        Set how long the heater is on in each window, the integer counterpart of set_duty()
+        :param on_ms: int; 0 to window_ms, values out of the range are clamped
+        """
+        if on_ms < self.min_switch_ms:
+            on_ms = 0
+        elif on_ms > self.window_ms - self.min_switch_ms:
+            on_ms = self.window_ms
+        if on_ms == self.on_ms:
+            return
+        self.on_ms = on_ms
+        if self.is_running:
+            self._apply(utime.ticks_diff(utime.ticks_ms(), self.window_start))
+
+    def _start_window(self, t):
+        self.window_start = utime.ticks_ms()
+        self._apply(0)
+
+    def _apply(self, elapsed_ms):
+        if self.on_ms >= self.window_ms:
+            # fully on, no switch-off edge in this window
+            self.edge_tim.deinit()
+            self.heater.set(True)
+            return
+        remaining = self.on_ms - elapsed_ms
+        if remaining < self.min_switch_ms:
+            self.edge_tim.deinit()
+            self.heater.set(False)
+        else:
+            self.heater.set(True)
+            self.edge_tim.init(period=remaining, mode=machine.Timer.ONE_SHOT, callback=self._edge_cb)
+
+    def _edge(self, t):
+        self.heater.set(False)
@@ -1,29 +1,417 @@
+import ubinascii
 import uos
 import ujson
+from uarray import array
+
+PROFILE_DIR = 'profiles'
+# the compiled profiles, one .bin per .json under PROFILE_DIR
+PROFILE_BIN_DIR = 'profiles_bin'
+# maps alloy names to profile files, rebuilt when the files in PROFILE_DIR change
+INDEX_FILE = 'profile_index.json'
+# number of compiled profiles kept in RAM
+CACHE_SIZE = 2
+# the chart the line points are scaled for: GUI.CHART_WIDTH, GUI.CHART_HEIGHT and GUI.CHART_TOP_PADDING
+CHART_GEOMETRY = (240, 120, 10)
+
+# A compiled profile is an array of int16 words: the header, the setpoint table, the profile points (time, temp),
+# the chart line points (x, y), the stages (time, temp, name length) sorted by time, then the title, the alloy
+# and the stage names as bytes
+BIN_MAGIC = 0x5052
+BIN_VERSION = 3
+# header words
+H_MAGIC = 0
+H_VERSION = 1
+# CRC-32 of the source json, split into 16 bit halves
+H_SOURCE_LO = 2
+H_SOURCE_HI = 3
+H_CHART_WIDTH = 4
+H_CHART_HEIGHT = 5
+H_CHART_PADDING = 6
+H_MELTING = 7
+H_MELTING_Y = 8
+H_TEMP_MIN = 9
+H_TEMP_MAX = 10
+H_TIME_MIN = 11
+H_TIME_MAX = 12
+H_TABLE_LEN = 13
+H_POINT_COUNT = 14
+H_STAGE_COUNT = 15
+H_TITLE_LEN = 16
+H_ALLOY_LEN = 17
+# 1 if the setpoint table is a monotone cubic through the profile points, 0 if linear
+H_SMOOTH = 18
+HEADER_WORDS = 19
+# Celsius the start temp of a stage may differ from the profile at its start time
+STAGE_TOLERANCE = 2
+# seconds between the chart line points of a smooth profile
+SMOOTH_CHART_STEP = 10
+# words of the buffers the compiled profiles are read into, they grow if a profile needs more
+BIN_BUFFER_WORDS = 1024
+
+
+def file_crc(path):
+    """
+    :return: int; CRC-32 of the file
+    """
+    crc = 0
+    buf = bytearray(256)
+    mv = memoryview(buf)
+    with open(path, 'rb') as f:
+        while True:
+            n = f.readinto(buf)
+            if not n:
+                break
+            crc = ubinascii.crc32(mv[:n], crc)
+    return crc
+
+
+def _int16(value):
+    return value - 0x10000 if value & 0x8000 else value
+
+
+def _fill_points(points, words, at, count, as_dict):
+    """
+    Set points to the count (x, y) word pairs of words from index at, reusing the lists or dicts it already holds
+    :param points: list to update in place
+    :param as_dict: bool; {'x': x, 'y': y} points for lv.line(), otherwise [x, y]
+    """
+    del points[count:]
+    for i in range(count):
+        x = words[at + i * 2]
+        y = words[at + i * 2 + 1]
+        if i == len(points):
+            points.append({'x': x, 'y': y} if as_dict else [x, y])
+        elif as_dict:
+            points[i]['x'] = x
+            points[i]['y'] = y
+        else:
+            points[i][0] = x
+            points[i][1] = y
+
+
+def _chart_factor(details, chart_width, chart_height, chart_top_padding):
+    temp_min = details.get('temp_range')[0]
+    temp_max = details.get('temp_range')[-1]
+    time_max = details.get('time_range')[-1]
+    x_factor = chart_width / time_max
+    y_factor = chart_height / (temp_max - temp_min + chart_top_padding)
+    temp_min_offset = temp_min * y_factor
+    return x_factor, y_factor, temp_min_offset
+
+
+def _segment_error(segment):
+    """
+    :return: str; what is wrong with a segment of a version 2 profile, None if it's valid
+    """
+    kinds = [kind for kind in ('ramp', 'time', 'hold') if kind in segment]
+    if len(kinds) != 1:
+        return 'needs exactly one of ramp, time and hold'
+    kind = kinds[0]
+    if kind != 'hold' and 'to' not in segment:
+        return 'a {} segment needs to'.format(kind)
+    if kind == 'ramp' and not segment['ramp']:
+        return 'ramp must not be 0'
+    if kind == 'time' and segment['time'] <= 0:
+        return 'time must be > 0'
+    if kind == 'hold' and segment['hold'] < 0:
+        return 'hold must be >= 0'
+    return None
+
+
+def _expand_segments(details, profile_path):
+    """
+    Expand the segments of a version 2 profile into profile points and stages.
+    Each segment runs from the temp the previous one ended at, and is one of:
+        {"to": temp, "ramp": rate}  ramp at rate Celsius per second to temp, the sign of rate doesn't matter
+        {"to": temp, "time": secs}  reach temp in secs seconds
+        {"hold": secs}              stay at the temp for secs seconds
+    A segment with "stage": name starts that stage.
+    :param details: dict; the profile json
+    :param profile_path: str; file name of the profile json, for the errors
+    :return: (list of [time, temp] profile points, list of (stage name, start time, start temp))
+    """
+    time = 0
+    temp = details.get('start_temp')
+    segments = details.get('segments')
+    if temp is None or not segments:
+        raise Exception('{}: a version 2 profile needs start_temp and segments'.format(profile_path))
+    points = [[time, temp]]
+    stage_list = []
+    for i, segment in enumerate(segments):
+        error = _segment_error(segment)
+        if error:
+            raise Exception('{}: segment {}: {}'.format(profile_path, i, error))
+        if 'stage' in segment:
+            stage_list.append((segment['stage'], time, temp))
+        if 'hold' in segment:
+            if not segment['hold']:
+                # only starts a stage, a second point at the same time would be a step
+                continue
+            time += segment['hold']
+        elif 'ramp' in segment:
+            time += max(1, int(abs(segment['to'] - temp) / abs(segment['ramp']) + 0.5))
+            temp = segment['to']
+        else:
+            time += segment['time']
+            temp = segment['to']
+        points.append([time, temp])
+    return points, stage_list
+
+
+def _smooth_table(points):
+    """
+    Monotone cubic interpolation of the profile points, one temp per second, with the Fritsch-Butland tangents
+    (the weighted harmonic mean of the neighbouring slopes).  It never overshoots the points,
+    so a hold stays flat and a peak stays at its temp.
+    :param points: list of [time, temp]
+    :return: list of int
+    """
+    slopes = [(p2[1] - p1[1]) / (p2[0] - p1[0]) for p1, p2 in zip(points, points[1:])]
+    tangents = [slopes[0]]
+    for i in range(1, len(slopes)):
+        d0, d1 = slopes[i - 1], slopes[i]
+        if d0 * d1 <= 0:
+            tangents.append(0)
+        else:
+            # weighted harmonic mean, which keeps each segment monotone
+            h0 = points[i][0] - points[i - 1][0]
+            h1 = points[i + 1][0] - points[i][0]
+            tangents.append(3 * (h0 + h1) / ((2 * h1 + h0) / d0 + (h1 + 2 * h0) / d1))
+    tangents.append(slopes[-1])
+    table = []
+    for i in range(len(slopes)):
+        (x1, y1), (x2, y2) = points[i], points[i + 1]
+        h = x2 - x1
+        m1 = tangents[i] * h
+        m2 = tangents[i + 1] * h
+        for sec in range(x1, x2):
+            t = (sec - x1) / h
+            t2 = t * t
+            t3 = t2 * t
+            y = (2 * t3 - 3 * t2 + 1) * y1 + (t3 - 2 * t2 + t) * m1 + (3 * t2 - 2 * t3) * y2 + (t3 - t2) * m2
+            table.append(int(y + 0.5))
+    return table
+
+
+def compile_profile(profile_path, source_crc):
+    """
+    Compile a profile json under PROFILE_DIR into its .bin under PROFILE_BIN_DIR, so that the control loop never
+    walks the profile points and the GUI never scales them.
+    The setpoint table holds one interpolated temp per second, from 0s to the last profile point.
+    A version 1 profile lists its points and stages, a version 2 profile lists segments, see _expand_segments().
+    The stages must start on the profile, within STAGE_TOLERANCE.
+    :param profile_path: str; file name of the profile json
+    :param source_crc: int; CRC-32 of the json, see file_crc(), a changed CRC means the .bin is out of date
+    """
+    with open(PROFILE_DIR + '/' + profile_path, 'r') as f:
+        details = ujson.load(f)
+    if details.get('version', 1) >= 2:
+        points, stage_list = _expand_segments(details, profile_path)
+    else:
+        points = details.get('profile')
+        stage_list = [(name, stage[0], stage[1]) for name, stage in details.get('stages').items()]
+    stage_list.sort(key=lambda stage: stage[1])
+    if 'temp_range' not in details:
+        details['temp_range'] = [min(p[1] for p in points), max(p[1] for p in points)]
+    if 'time_range' not in details:
+        details['time_range'] = [0, points[-1][0]]
+
+    # no setpoint before the first profile point
+    table = [0] * points[0][0]
+    smooth = details.get('interpolation') == 'smooth'
+    if smooth:
+        table += _smooth_table(points)
+    else:
+        x1, y1 = points[0]
+        for x2, y2 in points[1:]:
+            for sec in range(x1, x2):
+                table.append(int(y1 + (y2 - y1) * (sec - x1) // (x2 - x1)))
+            x1, y1 = x2, y2
+    for name, time, temp in stage_list:
+        profile_temp = table[time] if time < len(table) else points[-1][1]
+        if abs(profile_temp - temp) > STAGE_TOLERANCE:
+            raise Exception('{}: stage {} starts at {}C, the profile is at {}C at {}s'.format(
+                profile_path, name, temp, profile_temp, time))
+    if smooth:
+        # the chart line follows the curve
+        knots = {p[0]: p[1] for p in points}
+        times = sorted(set(knots) | set(range(points[0][0], points[-1][0], SMOOTH_CHART_STEP)))
+        points = [[t, knots[t] if t in knots else table[t]] for t in times]
+
+    x_factor, y_factor, temp_min_offset = _chart_factor(details, *CHART_GEOMETRY)
+    title = details.get('title').encode()
+    alloy = details.get('alloy').encode()
+    names = b''.join(stage[0].encode() for stage in stage_list)
+    words = array('h', (
+        BIN_MAGIC, BIN_VERSION, _int16(source_crc & 0xFFFF), _int16(source_crc >> 16),
+        CHART_GEOMETRY[0], CHART_GEOMETRY[1], CHART_GEOMETRY[2],
+        details.get('melting_point'), int(details.get('melting_point') * y_factor - temp_min_offset),
+        details.get('temp_range')[0], details.get('temp_range')[-1],
+        details.get('time_range')[0], details.get('time_range')[-1],
+        len(table), len(points), len(stage_list), len(title), len(alloy), int(smooth),
+    ))
+    for temp in table:
+        words.append(temp)
+    for p in points:
+        words.append(p[0])
+        words.append(p[-1])
+    for p in points:
+        words.append(int(p[0] * x_factor))
+        words.append(int(p[-1] * y_factor - temp_min_offset))
+    for name, time, temp in stage_list:
+        words.append(time)
+        words.append(temp)
+        words.append(len(name))
+    text = title + alloy + names
+    if len(text) % 2:
+        text += b'\0'
+    for i in range(0, len(text), 2):
+        word = text[i] | text[i + 1] << 8
+        words.append(_int16(word))
+    try:
+        uos.mkdir(PROFILE_BIN_DIR)
+    except OSError:
+        pass
+    with open(PROFILE_BIN_DIR + '/' + profile_path[:-5] + '.bin', 'wb') as f:
+        f.write(words)
 
 
 class LoadProfiles:
     def __init__(self, default_alloy_name):
-        self.profile_json_list = uos.listdir('profiles')
+        """
+        Only the index of the profiles is read at boot.  A profile is read when it's selected, from its compiled
+        .bin which is made from the json if it's missing or out of date, and the most recently selected ones are
+        kept in RAM.
+        :param default_alloy_name: str; the alloy to select
+        """
+        self.profile_json_list = []
         self.profile_alloy_names = []
-        self.profile_dict = {}
-        for profile_path in self.profile_json_list:
-            with open('profiles/' + profile_path, 'r') as f:
-                detail = ujson.load(f)
-                alloy_name = detail.get('alloy')
-                self.profile_alloy_names.append(alloy_name)
-                self.profile_dict[alloy_name] = detail
+        self.profile_files = {}
+        self._load_index()
+        # [alloy name, buffer, profile details, setpoint table, stage list, chart points], most recently used last.
+        # The buffers, the dicts and the lists are allocated once and reused for the profiles selected later,
+        # so a profile held in the cache is selected without any allocation.
+        self.cache = [
+            [None, array('h', [0] * BIN_BUFFER_WORDS), {'profile': [], 'stages': {}}, None, [], []]
+            for _ in range(CACHE_SIZE)
+        ]
         self.profile_details = None
+        self.setpoint_table = None
+        self.stage_list = None
+        # the chart points scaled for CHART_GEOMETRY and the melting temp line, of the selected profile
+        self.chart_words = None
+        self.chart_points = None
         self.default_alloy_index = self.profile_alloy_names.index(default_alloy_name)
         self.load_profile_details(default_alloy_name)
 
+    def _load_index(self):
+        """
+        Read the alloy names from the index, the profile files are only parsed if the index is out of date,
+        i.e. if a file was added, removed, resized or modified.  Only the directory is read for that, the profiles
+        are checked by their CRC-32 when they're selected.
+        """
+        self.profile_json_list = sorted(uos.listdir(PROFILE_DIR))
+        signature = []
+        for name in self.profile_json_list:
+            stat = uos.stat(PROFILE_DIR + '/' + name)
+            # size and mtime
+            signature.append('{}:{}:{}'.format(name, stat[6], stat[8]))
+        try:
+            with open(INDEX_FILE, 'r') as f:
+                index = ujson.load(f)
+        except (OSError, ValueError):
+            index = None
+        if not index or index.get('signature') != signature:
+            index = {'signature': signature, 'alloys': []}
+            for profile_path in self.profile_json_list:
+                with open(PROFILE_DIR + '/' + profile_path, 'r') as f:
+                    index['alloys'].append([ujson.load(f).get('alloy'), profile_path])
+            with open(INDEX_FILE, 'w') as f:
+                ujson.dump(index, f)
+        for alloy_name, profile_path in index['alloys']:
+            self.profile_alloy_names.append(alloy_name)
+            self.profile_files[alloy_name] = profile_path
+
     def get_profile_alloy_names(self):
         return self.profile_alloy_names
 
     def load_profile_details(self, selected_alloy_name):
-        self.profile_details = self.profile_dict.get(selected_alloy_name)
+        for slot in self.cache:
+            if slot[0] == selected_alloy_name:
+                break
+        else:
+            # reuse the buffer of the least recently used profile
+            slot = self.cache[0]
+            slot[0] = None
+            profile_path = self.profile_files[selected_alloy_name]
+            source_crc = file_crc(PROFILE_DIR + '/' + profile_path)
+            if not self._read_bin(slot, profile_path, source_crc):
+                compile_profile(profile_path, source_crc)
+                if not self._read_bin(slot, profile_path, source_crc):
+                    raise Exception('Failed to compile profile ' + profile_path)
+            slot[0] = selected_alloy_name
+        self.cache.remove(slot)
+        self.cache.append(slot)
+        self.profile_details, self.setpoint_table, self.stage_list, self.chart_points = slot[2:]
+        self.chart_words = slot[1]
         return self.profile_details
 
+    def _read_bin(self, slot, profile_path, source_crc):
+        """
+        Read a compiled profile into the buffer of a cache slot with a single readinto(), then decode it into the
+        details, the stage list and the chart points of the slot, in place.  Only the strings are new.
+        :return: bool; False if the .bin is missing or out of date
+        """
+        path = PROFILE_BIN_DIR + '/' + profile_path[:-5] + '.bin'
+        try:
+            size = uos.stat(path)[6]
+        except OSError:
+            return False
+        if len(slot[1]) * 2 < size:
+            slot[1] = array('h', [0] * ((size + 1) // 2))
+        words = slot[1]
+        with open(path, 'rb') as f:
+            f.readinto(words)
+        if (words[H_MAGIC] != BIN_MAGIC or words[H_VERSION] != BIN_VERSION
+                or (words[H_SOURCE_LO] & 0xFFFF) | (words[H_SOURCE_HI] & 0xFFFF) << 16 != source_crc
+                or (words[H_CHART_WIDTH], words[H_CHART_HEIGHT], words[H_CHART_PADDING]) != CHART_GEOMETRY):
+            return False
+        mv = memoryview(words)
+        table_len = words[H_TABLE_LEN]
+        point_count = words[H_POINT_COUNT]
+        stage_count = words[H_STAGE_COUNT]
+        points_at = HEADER_WORDS + table_len
+        stages_at = points_at + point_count * 4
+        text_at = stages_at + stage_count * 3
+        text_len = words[H_TITLE_LEN] + words[H_ALLOY_LEN]
+        for i in range(stage_count):
+            text_len += words[stages_at + i * 3 + 2]
+        text = bytes(mv[text_at:text_at + (text_len + 1) // 2])
+        title_end = words[H_TITLE_LEN]
+        alloy_end = title_end + words[H_ALLOY_LEN]
+        details = slot[2]
+        stage_list = slot[4]
+        stages = details['stages']
+        del stage_list[:]
+        stages.clear()
+        name_at = alloy_end
+        for i in range(stage_count):
+            name_len = words[stages_at + i * 3 + 2]
+            name = text[name_at:name_at + name_len].decode()
+            stage_list.append((name, words[stages_at + i * 3], words[stages_at + i * 3 + 1]))
+            stages[name] = [words[stages_at + i * 3], words[stages_at + i * 3 + 1]]
+            name_at += name_len
+        details['title'] = text[:title_end].decode()
+        details['alloy'] = text[title_end:alloy_end].decode()
+        details['melting_point'] = words[H_MELTING]
+        details['temp_range'] = [words[H_TEMP_MIN], words[H_TEMP_MAX]]
+        details['time_range'] = [words[H_TIME_MIN], words[H_TIME_MAX]]
+        details['interpolation'] = 'smooth' if words[H_SMOOTH] else 'linear'
+        _fill_points(details['profile'], words, points_at, point_count, False)
+        _fill_points(slot[5], words, points_at + point_count * 2, point_count, True)
+        slot[3] = mv[HEADER_WORDS:HEADER_WORDS + table_len]
+        return True
+
     def get_default_alloy_index(self):
         return self.default_alloy_index
 
@@ -69,17 +457,23 @@ class LoadProfiles:
             else:
                 raise Exception('Profile details must be loaded with load_profile_details(profile_name)')
 
-    def _calc_chart_factor(self, chart_width, chart_height, chart_top_padding):
-        temp_range = self.get_temp_range()
-        temp_min = temp_range[0]
-        temp_max = temp_range[-1]
-        time_range = self.get_time_range()
-        time_min = time_range[0]
-        time_max = time_range[-1]
-        x_factor = chart_width / time_max
-        y_factor = chart_height / (temp_max - temp_min + chart_top_padding)
-        temp_min_offset = temp_min * y_factor
-        return x_factor, y_factor, temp_min_offset
+    def get_setpoint_table(self):
+        """
+        :return: array('h') of setpoint temps indexed by seconds since the profile start
+        """
+        if self.profile_details:
+            return self.setpoint_table
+        else:
+            raise Exception('Profile details must be loaded with load_profile_details(profile_name)')
+
+    def get_stage_list(self):
+        """
+        :return: list of (stage name, start time, start temp) of the profile stages, sorted by time
+        """
+        if self.profile_details:
+            return self.stage_list
+        else:
+            raise Exception('Profile details must be loaded with load_profile_details(profile_name)')
 
     def get_profile_chart_points(self, chart_width, chart_height, chart_top_padding):
         """
@@ -88,10 +482,17 @@ class LoadProfiles:
         :param chart_width: width in pixel of the lv.chart
         :param chart_height: height in pixel of the lv.chart
         :param top_padding: empty space above the highest point
-        :return: list of point x & y
+        :return: list of point x & y, held by the profile cache for CHART_GEOMETRY: don't change it
         """
-        x_factor, y_factor, temp_min_offset = self._calc_chart_factor(chart_width, chart_height, chart_top_padding)
+        if self.profile_details is None:
+            raise Exception('Profile details must be loaded with load_profile_details(profile_name)')
+        if (chart_width, chart_height, chart_top_padding) == CHART_GEOMETRY:
+            # scaled when the profile was compiled, decoded when it was read
+            return self.chart_points
         temp_profile_list = self.get_temp_profile()
+        x_factor, y_factor, temp_min_offset = _chart_factor(
+            self.profile_details, chart_width, chart_height, chart_top_padding
+        )
         profile_chart_points = []
         for p in temp_profile_list:
             point = {
@@ -105,6 +506,12 @@ class LoadProfiles:
         """
         For drawing a horizontal line marking the melting temp of the ideal reflow profile.
         """
-        _, y_factor, temp_min_offset = self._calc_chart_factor(chart_width, chart_height, chart_top_padding)
+        if self.profile_details is None:
+            raise Exception('Profile details must be loaded with load_profile_details(profile_name)')
+        if (chart_width, chart_height, chart_top_padding) == CHART_GEOMETRY:
+            return self.chart_words[H_MELTING_Y]
+        _, y_factor, temp_min_offset = _chart_factor(
+            self.profile_details, chart_width, chart_height, chart_top_padding
+        )
         melting_temp = self.get_melting_temp()
         return int(melting_temp * y_factor - temp_min_offset)
@@ -0,0 +1,107 @@
+import ujson
+import utime
+from uarray import array
+
+# Upper bounds (us) of the handler time histogram buckets, the last bucket takes the rest
+BUCKETS_US = (1000, 2000, 5000, 10000, 20000, 50000, 100000, 200000)
+
+
+class LoopStats:
+    def __init__(self, period_ms):
+        """
+        Timing of the control loop: tick latency, tick-to-tick jitter and handler time.
+        Recording a tick is a handful of integer operations without allocation, so it's always on.
+        :param period_ms: int; nominal period of the control loop
+        """
+        self.period_us = period_ms * 1000
+        self.histogram = array('I', [0] * (len(BUCKETS_US) + 1))
+        self.reset()
+
+    def reset(self):
+        self.count = 0
+        self.last_start_us = None
+        self.latency_sum = 0
+        self.latency_max = 0
+        self.jitter_sum = 0
+        self.jitter_max = 0
+        self.run_sum = 0
+        self.run_max = 0
+        for i in range(len(self.histogram)):
+            self.histogram[i] = 0
+
+    def record(self, posted_us, start_us, run_us):
+        """
+        Record one tick of the control loop
+        :param posted_us: int; utime.ticks_us() when the timer posted the tick
+        :param start_us: int; utime.ticks_us() when the handler started
+        :param run_us: int; execution time of the handler
+        """
+        latency = utime.ticks_diff(start_us, posted_us)
+        self.latency_sum += latency
+        if latency > self.latency_max:
+            self.latency_max = latency
+        if self.last_start_us is not None:
+            jitter = abs(utime.ticks_diff(start_us, self.last_start_us) - self.period_us)
+            self.jitter_sum += jitter
+            if jitter > self.jitter_max:
+                self.jitter_max = jitter
+        self.last_start_us = start_us
+        self.run_sum += run_us
+        if run_us > self.run_max:
+            self.run_max = run_us
+        i = 0
+        for bound in BUCKETS_US:
+            if run_us <= bound:
+                break
+            i += 1
+        self.histogram[i] += 1
+        self.count += 1
+
+    def get_summary(self):
+        """
+        :return: dict of the averages, worst cases and the handler time histogram, all in us
+        """
+        count = self.count or 1
+        return {
+            'period_us': self.period_us,
+            'ticks': self.count,
+            'latency_avg': self.latency_sum // count,
+            'latency_max': self.latency_max,
+            'jitter_avg': self.jitter_sum // (count - 1 or 1),
+            'jitter_max': self.jitter_max,
+            'handler_avg': self.run_sum // count,
+            'handler_max': self.run_max,
+            'handler_buckets_us': list(BUCKETS_US),
+            'handler_histogram': list(self.histogram),
+        }
+
+    def get_text(self):
+        """
+        :return: str; the summary formatted for the GUI
+        """
+        summary = self.get_summary()
+        text = 'Ticks: {}\nLatency avg/max: {}/{}us\nJitter avg/max: {}/{}us\nHandler avg/max: {}/{}us\n'.format(
+            summary['ticks'],
+            summary['latency_avg'], summary['latency_max'],
+            summary['jitter_avg'], summary['jitter_max'],
+            summary['handler_avg'], summary['handler_max'],
+        )
+        lower = 0
+        for bound, n in zip(BUCKETS_US + (None,), self.histogram):
+            if bound is None:
+                text += '>{}ms: {}'.format(lower // 1000, n)
+            else:
+                text += '{}-{}ms: {}\n'.format(lower // 1000, bound // 1000, n)
+                lower = bound
+        return text
+
+    def dump(self, path, **extra):
+        """
+        Write the summary to a json file, e.g. at the end of a reflow process
+        :param path: str
+        :param extra: more items to save along with the summary
+        """
+        summary = self.get_summary()
+        summary.update(extra)
+        with open(path, 'w') as f:
+            ujson.dump(summary, f)
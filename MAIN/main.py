@@ -2,16 +2,26 @@ import machine
 import gc
 import ujson
 import uos
+import utime
 import lvgl as lv
 import lvesp32
 
+from boot_timeline import BootTimeline
 from ili9341 import ili9341
 from xpt2046 import xpt2046
+from settings import Settings
+
+# each phase of the boot is timed, see 'Boot Time' under Settings or boot_time.json
+boot_timeline = BootTimeline()
+boot_timeline.mark('firmware')
 
 machine.freq(240000000)
 
-with open('config.json', 'r') as f:
-    config = ujson.load(f)
+# falls back to the backup of config.json if it was damaged by a power loss
+settings = Settings('config.json')
+config = settings.load()
+root_files = uos.listdir()
+boot_timeline.mark('config')
 
 disp = ili9341(
     miso = config['tft_pins']['miso'],
@@ -28,79 +38,121 @@ disp = ili9341(
     height = 320 if config['tft_pins']['is_portrait'] else 240,
     rot = ili9341.PORTRAIT if config['tft_pins']['is_portrait'] else ili9341.LANDSCAPE
 )
+boot_timeline.mark('display')
 
 touch_args = {}
-if config.get('touch_cali_file') in uos.listdir():
+if config.get('touch_cali_file') in root_files:
     with open(config.get('touch_cali_file'), 'r') as f:
         touch_args = ujson.load(f)
 touch_args['cs'] = config['touch_pins']['cs']
 touch_args['transpose'] = config['tft_pins']['is_portrait']
 touch = xpt2046(**touch_args)
+boot_timeline.mark('touch')
 
-if config.get('touch_cali_file') not in uos.listdir():
+if config.get('touch_cali_file') not in root_files:
     from touch_cali import TouchCali
     touch_cali = TouchCali(touch, config)
     touch_cali.start()
 else:
-    import gc
-    import utime
     import _thread
     from buzzer import Buzzer
+    from heater import Heater, HeaterPWM
     from gui import GUI
     from load_profiles import LoadProfiles
     from oven_control import OvenControl
-    from pid import PID
+    from pid import PID, PIDFixed
+    from run_logger import RunLogger
+    from temp_sampler import TempSampler
 
     if config.get('sensor_type') == 'MAX6675':
         from max6675 import MAX6675 as Sensor
     else:
         from max31855 import MAX31855 as Sensor
+    boot_timeline.mark('imports')
 
     reflow_profiles = LoadProfiles(config['default_alloy'])
+    boot_timeline.mark('profiles')
 
     temp_sensor = Sensor(
         hwspi = config['sensor_pins']['hwspi'],
         cs = config['sensor_pins']['cs'],
         miso = config['sensor_pins']['miso'],
         sck = config['sensor_pins']['sck'],
-        offset = config['sensor_offset'],
-        cache_time = int(1000/config['sampling_hz'])
+        offset = config['sensor_offset']
     )
+    temp_sampler = TempSampler(temp_sensor)
 
-    heater = machine.Signal(
+    heater = Heater(machine.Signal(
         machine.Pin(config['heater_pins']['heater'], machine.Pin.OUT),
         invert=config['heater_pins']['heater_active_low']
-    )
-    heater.off()
-
-    buzzer = Buzzer(config['buzzer_pin'])
+    ))
+    heater_pwm = None
+    heater_control = config.get('heater_control', {})
+    if heater_control.get('mode') == 'time_proportional':
+        heater_pwm = HeaterPWM(
+            heater,
+            machine.Timer(1),
+            machine.Timer(2),
+            window_ms = heater_control.get('window_ms', 2000),
+            min_switch_ms = heater_control.get('min_switch_ms', 20)
+        )
+
+    boot_timeline.mark('sensor & heater')
+
+    # the songs are played by a timer, no thread needed, the song bank is read at the end of boot
+    buzzer = Buzzer(config['buzzer_pin'], machine.Timer(3))
+
+    run_logger = None
+    run_log = config.get('run_log', {})
+    if run_log.get('enable'):
+        run_logger = RunLogger(
+            run_log.get('file', 'run_log.bin'),
+            capacity = run_log.get('ring_records', 64),
+            block = run_log.get('block_records', 16)
+        )
 
     def measure_temp():
-        global TEMP_GUI_LAST_UPDATE
         while True:
+            # shares the control loop's sample while the reflow process is running
+            sample = temp_sampler.get(int(1000/config['display_refresh_hz']))
+            gui.temp_update(sample.temp if sample.error is None else sample.error)
+            if run_logger and run_logger.enabled:
+                # the run log is written to flash here, never by the control loop
+                try:
+                    run_logger.flush()
+                except Exception as e:
+                    # e.g. the file system is full, the log is dropped rather than retried
+                    print('Run log disabled: {}'.format(e))
+                    run_logger.disable()
+            # the settings changed on the GUI are written here too, a failed write is retried at the next pass
             try:
-                t = temp_sensor.get_temp()
+                settings.flush()
             except Exception as e:
-                t = str(e)
-            gui.temp_update(t)
+                print('Settings not saved: {}'.format(e))
             gc.collect()
             utime.sleep_ms(int(1000/config['display_refresh_hz']))
 
-    def buzzer_activate():
-        while True:
-            if buzzer.song:
-                buzzer.play_song(buzzer.song)
-                gc.collect()
+    if heater_control.get('fixed_point'):
+        pid = PIDFixed(config['pid']['kp'], config['pid']['ki'], config['pid']['kd'])
+    else:
+        pid = PID(config['pid']['kp'], config['pid']['ki'], config['pid']['kd'])
 
+    boot_timeline.mark('buzzer & pid')
+
+    gui = GUI(reflow_profiles, settings, pid, temp_sensor)
+    # the thread updates the GUI, it's started once the GUI is there
     _thread.stack_size(7 * 1024)
     temp_th = _thread.start_new_thread(measure_temp, ())
-    buzzer_th = _thread.start_new_thread(buzzer_activate, ())
-
-    pid = PID(config['pid']['kp'], config['pid']['ki'], config['pid']['kd'])
-
-    gui = GUI(reflow_profiles, config, pid, temp_sensor)
-
-    oven_control = OvenControl(heater, temp_sensor, pid, reflow_profiles, gui, buzzer, machine.Timer(0), config)
+    boot_timeline.mark('gui & thread')
+
+    oven_control = OvenControl(heater, temp_sampler, pid, reflow_profiles, gui, buzzer, machine.Timer(0), config,
+                               heater_pwm, run_logger)
+    boot_timeline.mark('oven control')
+    gui.add_boot_timeline_cb(boot_timeline.get_text)
+    # the Start button is usable from here, the rest is off the critical path
+    boot_timeline.save()
+    # the songs of the reflow process are played from RAM, never read from flash by the control loop
+    buzzer.preload(oven_control.get_song_names())
 
 # Starting FTP service for future updates
 if config['ftp']['enable']:
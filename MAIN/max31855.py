@@ -23,6 +23,8 @@ class MAX31855:
         """
         baudrate = 10**5
         self._offset = offset
+        # the offset in quarter degrees for read_raw()
+        self._offset_q = int(round(offset * 4))
         self._cs = Pin(cs, Pin.OUT)
         self._data = bytearray(4)
         self.cache_time = cache_time
@@ -41,8 +43,9 @@ class MAX31855:
 
     def set_offset(self, offset):
         self._offset = offset
+        self._offset_q = int(round(offset * 4))
 
-    def read_temp(self, internal=False):
+    def _read(self):
         self._cs.value(0)
         try:
             self._spi.readinto(self._data)
@@ -58,6 +61,20 @@ class MAX31855:
         if self._data[1] & 0x01:
             raise RuntimeError("ERR") # faulty reading
 
+    def read_raw(self):
+        """
+        Read the thermocouple temp as an integer number of quarter degrees, offset included.
+        Integer only, so it doesn't allocate.
+        """
+        self._read()
+        temp = self._data[0] << 8 | self._data[1]
+        if temp & 0x8000:
+            temp -= 0x10000
+        self.last_read_time = utime.ticks_ms()
+        return (temp >> 2) + self._offset_q
+
+    def read_temp(self, internal=False):
+        self._read()
         temp, refer = ustruct.unpack('>hh', self._data)
         refer >>= 4
         temp >>= 2
@@ -6,7 +6,10 @@ class MAX6675:
     def __init__(self, hwspi=2, cs=None, sck=None, miso=None, offset=0.0, cache_time=0):
         baudrate = 10**5
         self._offset = offset
+        # the offset in quarter degrees for read_raw()
+        self._offset_q = int(round(offset * 4))
         self._cs = Pin(cs, Pin.OUT)
+        self._data = bytearray(2)
         self.cache_time = cache_time
         self.last_read = 0
         self.last_read_time = 0
@@ -23,18 +26,30 @@ class MAX6675:
 
     def set_offset(self, offset):
         self._offset = offset
+        self._offset_q = int(round(offset * 4))
 
-    def read_temp(self, internal=False):
-        data = bytearray(2)
+    def _read(self):
         self._cs.value(0)
         try:
-            self._spi.readinto(data)
+            self._spi.readinto(self._data)
         finally:
             self._cs.value(1)
 
-        if data[1] & 0x04:
+        if self._data[1] & 0x04:
             raise RuntimeError("NC") # not connected
 
+    def read_raw(self):
+        """
+        Read the thermocouple temp as an integer number of quarter degrees, offset included.
+        Integer only, so it doesn't allocate.
+        """
+        self._read()
+        self.last_read_time = utime.ticks_ms()
+        return ((self._data[0] << 8 | self._data[1]) >> 3) + self._offset_q
+
+    def read_temp(self, internal=False):
+        self._read()
+        data = self._data
         self.last_read_time = utime.ticks_ms()
         self.last_read = ((data[0]<<8 | data[1]) >> 3) * 0.25 + self._offset
         return self.last_read
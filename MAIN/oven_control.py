@@ -1,170 +1,277 @@
-import machine
 import utime
 
+from control_task import ControlTask
+from loop_stats import LoopStats
+from reflow_states import HEATER_ON, HEATER_PID, WAIT_TEMP, build_state_table, get_state_names
+
+
 class OvenControl:
-    states = ("wait", "ready", "start", "preheat", "soak", "reflow", "cool")
 
-    def __init__(self, oven_obj, temp_sensor_obj, pid_obj, reflow_profiles_obj, gui_obj, buzzer_obj, timer_obj, config):
+    def __init__(self, oven_obj, temp_sampler_obj, pid_obj, reflow_profiles_obj, gui_obj, buzzer_obj, timer_obj, config,
+                 heater_pwm_obj=None, run_logger_obj=None):
         self.config = config
         self.oven = oven_obj
+        # time-proportional heater control if set, otherwise the heater is switched on/off directly
+        self.heater_pwm = heater_pwm_obj
+        # logs every control tick of the reflow process if set
+        self.run_logger = run_logger_obj
+        self.run_start_ms = 0
+        # the setpoint (quarter degrees) and the PID output (x100) of the current tick, for the run log
+        self.log_setpoint_q = 0
+        self.log_output = 0
         self.gui = gui_obj
         self.beep = buzzer_obj
-        self.tim = timer_obj
         self.pid = pid_obj
         self.profiles = reflow_profiles_obj
-        self.sensor = temp_sensor_obj
-        self.ontemp = self.get_temp()
-        self.offtemp = self.ontemp
-        self.ontime = 0
-        self.offtime = 0
+        self.sampler = temp_sampler_obj
+        # the sample of the current control tick, shared by the temp control and the chart
+        self.sample = self.sampler.latest
+        # the temp of the current control tick in quarter degrees, fixed-point control only
+        self.temp_q = 0
+        # refresh the LED on the GUI whenever the heater switches
+        self.oven.on_change = self._led_update
         self.SAMPLING_HZ = self.config.get('sampling_hz')
+        # the timer only posts the ticks, the control work runs in task context
+        self.loop_stats = LoopStats(int(1000 / self.SAMPLING_HZ))
+        self.control_task = ControlTask(
+            timer_obj, int(1000 / self.SAMPLING_HZ), self._control_cb_handler, self.loop_stats
+        )
         self.PREHEAT_UNTIL = self.config.get('advanced_temp_tuning').get('preheat_until')
         self.PREVISIONING = self.config.get('advanced_temp_tuning').get('previsioning')
         self.OVERSHOOT_COMP = self.config.get('advanced_temp_tuning').get('overshoot_comp')
-        self.reflow_start = 0
+        self.STAGE_EXIT_LEAD = self.config.get('advanced_temp_tuning').get('stage_exit_lead', 15)
+        self.PWM_FULL_SCALE = self.config.get('heater_control', {}).get('full_scale', 1.0)
+        # Fixed-point control: temps are carried as integer quarter degrees from the sensor to the heater,
+        # the PID must be a PIDFixed then
+        self.FIXED_POINT = self.config.get('heater_control', {}).get('fixed_point', False)
+        self.PREHEAT_UNTIL_Q = int(self.PREHEAT_UNTIL * 4)
+        self.PREVISIONING_SEC = int(self.PREVISIONING)
+        self.OVERSHOOT_COMP_Q = int(self.OVERSHOOT_COMP * 4)
+        self.PWM_FULL_SCALE_Q = max(1, int(self.PWM_FULL_SCALE * 4))
         self.oven_state = 'ready'
         self.last_state = 'ready'
+        self.state_start = 0
         self.timer_timediff = 0
         self.stage_timediff = 0
         self.stage_text = ''
-        self.temp_points = []
+        # number of temp points drawn on the chart in the current reflow process
+        self.temp_point_count = 0
         self.has_started = False
         self.timer_start_time = None
         self.stage_start_time = None
         self.timer_last_called = None
+        # RelayAutoTune while the PID is being auto-tuned
+        self.autotune = None
+        self.setpoint_table = self.profiles.get_setpoint_table()
+        self.state_table = None
+        self.state = None
+        self._build_state_table()
         self.oven_reset()
         self.format_time(0)
         self.gui.add_reflow_process_start_cb(self.reflow_process_start)
         self.gui.add_reflow_process_stop_cb(self.reflow_process_stop)
+        self.gui.add_loop_stats_cb(self.get_loop_stats_text)
+        self.gui.add_autotune_start_cb(self.autotune_start)
+
+    def get_song_names(self):
+        """
+        :return: list of the songs the reflow process plays, see Buzzer.preload()
+        """
+        songs = ['Stop']
+        for state in self.state_table.values():
+            if state.song and state.song not in songs:
+                songs.append(state.song)
+        return songs
+
+    def _build_state_table(self):
+        """
+        Compile the transition table of the reflow process from the stages of the selected profile
+        """
+        self.state_table = build_state_table(self.profiles.get_stage_list(), self.STAGE_EXIT_LEAD)
+        self.state_table['start'].on_entry = self._start_elapsed_timer
+        self.state = self.state_table[self.oven_state]
 
     def set_oven_state(self, state):
+        if state == self.oven_state:
+            return
+        self._state_exit(self.state)
+        self.last_state = self.oven_state
         self.oven_state = state
-        self._oven_state_change_timing_alert()
+        self.state = self.state_table[state]
+        self._state_entry(self.state)
+
+    def _state_entry(self, state):
+        self.state_start = utime.time()
+        if state.song:
+            self.beep.activate(state.song)
+        if state.ki_enabled:
+            self.pid.ki_enable(True)
+        # Update stage message to user
+        self.stage_text = state.text
+        self.gui.set_stage_text(self.stage_text)
+        if state.on_entry:
+            state.on_entry()
+
+    def _state_exit(self, state):
+        if state.ki_enabled:
+            self.pid.ki_enable(False)
+        if state.on_exit:
+            state.on_exit()
+
+    def _start_elapsed_timer(self):
+        # the elapsed timer starts here
+        if self.last_state == 'ready' or self.last_state == 'wait':
+            self.timer_start_time = utime.time()
 
     def get_profile_temp(self, seconds):
-        x1 = self.profiles.get_temp_profile()[0][0]
-        y1 = self.profiles.get_temp_profile()[0][1]
-        for point in self.profiles.get_temp_profile():
-            x2 = point[0]
-            y2 = point[1]
-            if x1 <= seconds < x2:
-                temp = y1 + (y2 - y1) * (seconds - x1) // (x2 - x1)
-                return temp
-            x1 = x2
-            y1 = y2
+        # setpoint_table is compiled by LoadProfiles when the profile is selected
+        if 0 <= seconds < len(self.setpoint_table):
+            return self.setpoint_table[seconds]
         return 0
 
     def oven_reset(self):
-        self.ontime = 0
-        self.offtime = 0
-        self.reflow_start = 0
         self.oven_enable(False)
 
     def get_temp(self):
-        try:
-            return self.sensor.get_temp()
-        except Exception as e:
-            print('Emergency off')
-            self.oven.off()
-            self.ontime = 0
-            self.offtime = 0
-            self.reflow_start = 0
-            self.offtemp = 0
-            self.has_started = False
-            self.gui.led_turn_off()
-            return 0
+        """
+        The temp of the current control tick's sample, whole degrees with fixed-point control
+        """
+        if self.FIXED_POINT:
+            if self.sampler.error is None:
+                return self.temp_q >> 2
+        elif self.sample.error is None:
+            return self.sample.temp
+        print('Emergency off')
+        self.oven_enable(False)
+        self.has_started = False
+        return 0
+
+    def _take_sample(self):
+        """
+        One sensor reading per tick, shared by the control logic and the chart
+        """
+        if self.FIXED_POINT:
+            self.temp_q = self.sampler.sample_q()
+        else:
+            self.sample = self.sampler.sample()
 
     def oven_enable(self, enable):
-        # self.control = enable
-        if enable:
-            self.oven.on()
+        # the heater only acts when it actually switches
+        if self.heater_pwm:
+            self.heater_pwm.set_duty(1 if enable else 0)
+        else:
+            self.oven.set(enable)
+
+    def _led_update(self, is_on):
+        """
+        Called by the heater after it has switched, deferred out of the control tick
+        """
+        if is_on:
             self.gui.led_turn_on()
-            self.offtime = 0
-            self.ontime = utime.time()
-            self.ontemp = self.get_temp()
         else:
-            self.oven.off()
             self.gui.led_turn_off()
-            self.offtime = utime.time()
-            self.ontime = 0
-            self.offtemp = self.get_temp()
 
     def format_time(self, sec):
-        minutes = sec // 60
-        seconds = int(sec) % 60
-        time = "{:02d}:{:02d}".format(minutes, seconds, width=2)
-        self.gui.set_timer_text(time)
+        # formatted by the GUI, and only when the shown second changes
+        self.gui.set_timer_text(int(sec))
 
     def _reflow_temp_control(self):
-        """This function is called every 100ms"""
-        stages = self.profiles.get_profile_stages()
+        """This function is called every 200ms"""
+        state = self.state
         temp = self.get_temp()
-        if self.oven_state == "ready":
-            self.oven_enable(False)
-        if self.oven_state == "wait":
-            self.oven_enable(False)
-            if temp < 50:
-                self.set_oven_state("start")
-        if self.oven_state == "start":
-            self.oven_enable(True)
-        if self.oven_state == "start" and temp >= stages.get('preheat')[1]:
-            self.set_oven_state("preheat")
-        if self.oven_state == "preheat" and temp >= stages.get("soak")[1]:
-            self.set_oven_state("soak")
-        if self.oven_state == "soak" and temp >= stages.get("reflow")[1]:
-            self.set_oven_state("reflow")
-        if (self.oven_state == "reflow"
-                and temp >= stages.get("cool")[1]
-                and self.reflow_start > 0
-                and (utime.time() - self.reflow_start >=
-                     stages.get("cool")[0] - stages.get("reflow")[0] - 15)):
-            self.set_oven_state("cool")
-        if self.oven_state == "cool":
-            self.oven_enable(False)
-        if self.oven_state == 'cool' and len(self.temp_points) >= len(self.gui.chart_point_list):
+        # One dispatch per tick: check the single outgoing transition of the current state
+        if state.next_state:
+            if ((state.min_temp is None or temp >= state.min_temp)
+                    and (state.max_temp is None or temp < state.max_temp)
+                    and (not state.min_dwell or utime.time() - self.state_start >= state.min_dwell)):
+                self.set_oven_state(state.next_state)
+                state = self.state
+        elif state.is_last and self.temp_point_count >= self.gui.point_count:
             self.beep.activate('Stop')
             self.has_started = False
 
-        if self.oven_state in ("start", "preheat", "soak", "reflow"):
-            # Update stage time diff
-            if self.stage_start_time:
-                self.stage_timediff = int(utime.time() - self.stage_start_time)
-            # oven temp control here
-            current_temp = self.get_temp()
-            # if self.oven_state == 'start':
-            #     new_start_time = self.stage_timediff
-            # else:
-            #     new_start_time = self.stage_timediff + stages.get(self.oven_state)[0]
-            # set_temp = self.get_profile_temp(int(new_start_time + self.PROVISIONING)) - self.OVERSHOOT_COMP
-            # set_temp = self.get_profile_temp(int(self.stage_timediff + self.PROVISIONING)) - self.OVERSHOOT_COMP
-            set_temp = self.get_profile_temp(int(self.stage_timediff + self.PREVISIONING))
-            # Ignore PID & keep heating on during the early stage
-            # if current_temp < self.PREHEAT_UNTIL or self.oven_state == 'start':
-            if current_temp < self.PREHEAT_UNTIL:
+        if state.heater == HEATER_PID:
+            if self.FIXED_POINT:
+                self._pid_control_q(self.temp_q)
+            else:
+                self._pid_control(temp)
+        else:
+            self.log_setpoint_q = 0
+            self.log_output = 0
+            self.oven_enable(state.heater == HEATER_ON)
+
+        if self.run_logger:
+            # the log is only for debugging, it must never stop the heater control
+            try:
+                self.run_logger.log(
+                    utime.ticks_diff(utime.ticks_ms(), self.run_start_ms),
+                    self.temp_q if self.FIXED_POINT else int(temp * 4),
+                    int(self.log_setpoint_q),
+                    self.log_output,
+                    self.oven.is_on,
+                    state.index
+                )
+            except Exception:
+                self.run_logger.errors += 1
+
+    def _pid_control(self, current_temp):
+        # Update stage time diff
+        if self.stage_start_time:
+            self.stage_timediff = int(utime.time() - self.stage_start_time)
+        set_temp = self.get_profile_temp(int(self.stage_timediff + self.PREVISIONING))
+        self.log_setpoint_q = set_temp * 4
+        # Ignore PID & keep heating on during the early stage
+        if current_temp < self.PREHEAT_UNTIL:
+            self.log_output = 0
+            self.oven_enable(True)
+        else:
+            pid_output = self.pid.update(current_temp, set_temp)
+            self.log_output = int(pid_output * 100)
+
+            if current_temp > set_temp - self.OVERSHOOT_COMP:
+                self.oven_enable(False)
+            elif self.heater_pwm:
+                # time-proportional: the PID output is the duty of the heater
+                self.heater_pwm.set_duty(pid_output / self.PWM_FULL_SCALE)
+            elif current_temp < set_temp + pid_output:
+                self.oven_enable(True)
+            else:
+                self.oven_enable(False)
+
+    def _pid_control_q(self, current_temp_q):
+        """
+        _pid_control() in integer quarter degrees, it doesn't allocate
+        """
+        if self.stage_start_time:
+            self.stage_timediff = utime.time() - self.stage_start_time
+        set_temp_q = self.get_profile_temp(self.stage_timediff + self.PREVISIONING_SEC) << 2
+        self.log_setpoint_q = set_temp_q
+        # Ignore PID & keep heating on during the early stage
+        if current_temp_q < self.PREHEAT_UNTIL_Q:
+            self.log_output = 0
+            self.oven_enable(True)
+        else:
+            pid_output_q = self.pid.update_q(current_temp_q, set_temp_q)
+            self.log_output = pid_output_q * 25
+
+            if current_temp_q > set_temp_q - self.OVERSHOOT_COMP_Q:
+                self.oven_enable(False)
+            elif self.heater_pwm:
+                # time-proportional: the PID output is the duty of the heater
+                self.heater_pwm.set_on_ms(pid_output_q * self.heater_pwm.window_ms // self.PWM_FULL_SCALE_Q)
+            elif current_temp_q < set_temp_q + pid_output_q:
                 self.oven_enable(True)
             else:
-                if self.oven_state == 'reflow':
-                    self.pid.ki_enable(True)
-                else:
-                    self.pid.ki_enable(False)
-                pid_output = self.pid.update(current_temp, set_temp)
-                target_temp = set_temp + pid_output
-
-                if current_temp > set_temp - self.OVERSHOOT_COMP:
-                    self.oven_enable(False)
-                elif current_temp < target_temp:
-                    self.oven_enable(True)
-                else:
-                    self.oven_enable(False)
+                self.oven_enable(False)
 
     def _chart_update(self):
         low_end = self.profiles.get_temp_range()[0]
         oven_temp = self.get_temp()
         if oven_temp >= low_end:
-            self.temp_points.append(int(oven_temp))
-            self.gui.chart_update(self.temp_points)
+            self.temp_point_count += 1
+            self.gui.chart_update(int(oven_temp))
             # Reset the stage timer when the temp reaches the low end
-            if len(self.temp_points) == 1:
+            if self.temp_point_count == 1:
                 self.stage_start_time = utime.time()
 
     def _elapsed_timer_update(self):
@@ -172,97 +279,130 @@ class OvenControl:
         self.timer_timediff = int(now - self.timer_start_time)
         self.format_time(self.timer_timediff)
 
-    def _stage_timimg(self):
-        # the elapsed timer starts here
-        if self.oven_state == 'start' and (self.last_state == 'ready' or self.last_state == 'wait'):
-            self.timer_start_time = utime.time()
-        # the reflow timer starts here
-        if self.oven_state == 'reflow' and self.last_state != "reflow":
-            self.reflow_start = utime.time()
-
-    def _oven_state_change_timing_alert(self):
-        self._stage_timimg()
-        if self.oven_state != self.last_state:
-            # Reset the stage timer when a new stage starts
-            # self.stage_start_time = utime.time()
-            if self.oven_state == 'start':
-                self.beep.activate('Start')
-            elif self.oven_state == 'cool':
-                self.beep.activate('SMBwater')
-            elif self.oven_state == 'ready':
-                pass
-            elif self.oven_state == 'wait':
-                self.beep.activate('TAG')
-            else:
-                self.beep.activate('Next')
-            # Update stage message to user
-            self._stage_message_update()
-            self.last_state = self.oven_state
-
-    def _stage_message_update(self):
-        if self.oven_state == "ready":
-            self.stage_text = "#003399 Ready#"
-        if self.oven_state == "start":
-            self.stage_text = "#009900 Starting#"
-        if self.oven_state == "preheat":
-            self.stage_text = "#FF6600 Preheat#"
-        if self.oven_state == "soak":
-            self.stage_text = "#FF0066 Soak#"
-        if self.oven_state == "reflow":
-            self.stage_text = "#FF0000 Reflow#"
-        if self.oven_state == "cool" or self.oven_state == "wait":
-            self.stage_text = "#0000FF Cool Down, Open Door#"
-        self.gui.set_stage_text(self.stage_text)
-
     def _control_cb_handler(self):
         if self.has_started:
+            self._take_sample()
             # Oven temperature control logic
             # With PID, temp control logic should be called once per 100ms
-            self._reflow_temp_control()
+            if self.autotune:
+                self._autotune_control()
+            else:
+                self._reflow_temp_control()
             # Below methods are called once per second
             if not self.timer_last_called:
                 self.timer_last_called = utime.ticks_ms()
             if utime.ticks_diff(utime.ticks_ms(), self.timer_last_called) >= 1000:
-                if self.oven_state in ("start", "preheat", "soak", "reflow", 'cool'):
+                if self.autotune:
+                    self._elapsed_timer_update()
+                elif self.oven_state != 'ready' and self.oven_state != 'wait':
                     # Update gui temp chart
                     self._chart_update()
                     # Update elapsed timer
                     self._elapsed_timer_update()
                 self.timer_last_called = utime.ticks_ms()
         else:
-            self.tim.deinit()
-            # Same effect as click Stop button on GUI
-            self.gui.set_reflow_process_on(False)
+            self.control_task.stop()
+            # the heater is off from now, the GUI stops the rest like the Stop button does at its next frame
+            self.oven_enable(False)
+            self.gui.post_reflow_process_off()
+
+    def get_loop_stats_text(self):
+        """
+        Timing of the control loop of the current or the last reflow process, shown in the settings of the GUI
+        """
+        return 'Overrun: {}  Missed: {}\n'.format(
+            self.control_task.overruns, self.control_task.missed
+        ) + self.loop_stats.get_text()
+
+    def _autotune_control(self):
+        temp = self.get_temp()
+        if not self.has_started:
+            # sensor fault
+            return
+        if self.FIXED_POINT:
+            temp = self.temp_q / 4
+        self.oven_enable(self.autotune.update(temp, utime.ticks_ms()))
+        if self.autotune.is_done:
+            self.has_started = False
+            self.beep.activate('Stop')
+            self.gui.post_autotune_result(self.autotune.get_gains(self.SAMPLING_HZ), self.autotune.error)
+
+    def autotune_start(self):
+        """
+        This method is called by confirming Auto-Tune in the settings of the GUI
+        """
+        if not self.heater_pwm:
+            # in on_off mode the PID output is a setpoint offset in Celsius, not a heater duty like the relay's,
+            # so the gains derived from the oscillation would be in the wrong units
+            self.gui.post_reflow_process_off()
+            self.gui.post_autotune_result(None, 'needs the time_proportional heater mode')
+            return
+        # imported on first use, it's not needed to boot
+        from autotune import RelayAutoTune
+        tune_config = self.config.get('autotune', {})
+        self.autotune = RelayAutoTune(
+            tune_config.get('setpoint', 150),
+            hysteresis=tune_config.get('hysteresis', 2),
+            cycles=tune_config.get('cycles', 3),
+            output_span=self.PWM_FULL_SCALE,
+            rule=tune_config.get('rule', 'no_overshoot')
+        )
+        self.has_started = True
+        self.oven.reset_stats()
+        self.heater_pwm.start()
+        self.timer_start_time = utime.time()
+        self.stage_text = '#9900CC Auto-Tune#'
+        self.gui.set_stage_text(self.stage_text)
+        self.control_task.start()
 
     def reflow_process_start(self):
         """
         This method is called by clicking Start button on the GUI
         """
-        # clear the chart temp list
-        self.temp_points = []
+        # the chart is cleared by the GUI
+        self.temp_point_count = 0
+        # pick up the tables compiled for the currently selected profile
+        self.setpoint_table = self.profiles.get_setpoint_table()
+        # the process always starts from 'ready', which every state table has
+        self.set_oven_state('ready')
+        self._build_state_table()
+        if self.run_logger:
+            self.run_start_ms = utime.ticks_ms()
+            self.run_logger.start(int(1000 / self.SAMPLING_HZ), get_state_names(self.state_table))
         # reset the timer for the whole process
         # self.start_time = utime.time()
         # mark the progress to start
         self.has_started = True
+        self.oven.reset_stats()
+        if self.heater_pwm:
+            self.heater_pwm.start()
         # set the oven state to start
-        if self.get_temp() >= 50:
+        self._take_sample()
+        if self.get_temp() >= WAIT_TEMP:
             self.set_oven_state('wait')
         else:
             self.set_oven_state('start')
-        # initialize the hardware timer to call the control callback once every 200ms
+        # start calling the control callback once every 200ms
         # With PID, the period of the timer should be 200ms now
-        self.tim.init(
-            period=int(1000 / self.SAMPLING_HZ),
-            mode=machine.Timer.PERIODIC,
-            callback=lambda t: self._control_cb_handler()
-        )
+        self.control_task.start()
 
     def reflow_process_stop(self):
         """
         This method is called by clicking Stop button on the GUI
         """
-        self.tim.deinit()
+        self.control_task.stop()
+        if self.loop_stats.count:
+            self.loop_stats.dump(
+                'loop_stats.json',
+                overruns=self.control_task.overruns,
+                missed=self.control_task.missed
+            )
+        if self.run_logger:
+            self.run_logger.stop()
         self.has_started = False
+        self.autotune = None
+        if self.heater_pwm:
+            self.heater_pwm.stop()
         self.oven_reset()
         self.timer_start_time = None
         self.timer_timediff = 0
@@ -47,3 +47,53 @@ class PID:
             self.k_p = self.k_p_backup
             self.k_i = self.k_i_backup
             self.k_d = self.k_d_backup
+
+
+class PIDFixed(PID):
+    # The gains are held as integers scaled by 2**SHIFT
+    SHIFT = 12
+    # each term of update_q() is kept within this, so that their sum stays a small int (31 bits on the ESP32)
+    TERM_LIMIT = 1 << 28
+
+    def __init__(self, kp=2, ki=0.0001, kd=2):
+        """
+        The same PID in integer arithmetic, temps are in quarter degrees.
+        Small integers don't allocate in MicroPython, so update_q() runs without heap allocation.
+        """
+        super().__init__(kp, ki, kd)
+        self._scale_gains()
+
+    def _scale_gains(self):
+        self.kp_q = int(round(self.k_p * (1 << PIDFixed.SHIFT)))
+        self.ki_q = int(round(self.k_i * (1 << PIDFixed.SHIFT)))
+        self.kd_q = int(round(self.k_d * (1 << PIDFixed.SHIFT)))
+        # the largest error, integration and error change whose products with the gains are within TERM_LIMIT
+        self.error_max = PIDFixed.TERM_LIMIT // max(1, abs(self.kp_q))
+        self.integration_max = PIDFixed.TERM_LIMIT // max(1, abs(self.ki_q))
+        self.d_error_max = PIDFixed.TERM_LIMIT // max(1, abs(self.kd_q))
+
+    def update_q(self, temp_q, setpoint_q):
+        """
+        temp_q: int; real-time temperature in quarter degrees
+        setpoint_q: int; target temperature in quarter degrees
+        return: int; temperature correction in quarter degrees
+        The error, its change and the integration are clamped, so that no product allocates a long int.
+        """
+        error = max(-self.error_max, min(self.error_max, setpoint_q - temp_q))
+        if self.last_error == 0:
+            self.last_error = error #catch first run error
+
+        d_error = max(-self.d_error_max, min(self.d_error_max, error - self.last_error))
+        self.last_error = error
+        if self.ki_is_enabled:
+            self.integration = max(-self.integration_max, min(self.integration_max, self.integration + error))
+
+        self.last_output = (self.kp_q * error + self.ki_q * self.integration + self.kd_q * d_error) >> PIDFixed.SHIFT
+        return self.last_output
+
+    def update(self, temp, setpoint):
+        return self.update_q(int(round(temp * 4)), int(round(setpoint * 4))) * 0.25
+
+    def reset(self, kp=0, ki=0, kd=0):
+        super().reset(kp, ki, kd)
+        self._scale_gains()
@@ -0,0 +1,100 @@
+# What the heater does in a state
+HEATER_OFF = 0
+HEATER_ON = 1
+HEATER_PID = 2
+
+# The oven has to cool down below this temp before a new reflow process can start
+WAIT_TEMP = 50
+
+# Colors of the stage text on the GUI, other stages fall back to DEFAULT_STAGE_COLOR
+STAGE_COLORS = {
+    'preheat': 'FF6600',
+    'soak': 'FF0066',
+    'reflow': 'FF0000',
+}
+DEFAULT_STAGE_COLOR = 'FF6600'
+COOL_TEXT = '#0000FF Cool Down, Open Door#'
+
+
+class ReflowState:
+    def __init__(self, name, text, heater=HEATER_OFF, song=None):
+        """
+        One state of the reflow process and its single outgoing transition.
+        :param name: str; state name, e.g. 'ready', 'start', or a stage name of the profile
+        :param text: str; recolored stage text shown on the GUI
+        :param heater: HEATER_OFF, HEATER_ON or HEATER_PID
+        :param song: str; the song to play when entering the state
+        """
+        self.name = name
+        self.text = text
+        self.heater = heater
+        self.song = song
+        # Position of the state in the table, a small int standing for the state, e.g. in the run log
+        self.index = 0
+        # The state to go next, once all the conditions below are met
+        self.next_state = None
+        self.min_temp = None
+        self.max_temp = None
+        self.min_dwell = 0
+        # The integration of the PID is only enabled within this state
+        self.ki_enabled = False
+        # The last stage finishes the process once the chart is full
+        self.is_last = False
+        # Hooks, callables without arguments
+        self.on_entry = None
+        self.on_exit = None
+
+
+def build_state_table(stage_list, stage_exit_lead):
+    """
+    Compile the transition table of the reflow process from the stages of the profile.
+    ready -> (wait ->) start -> stage 1 -> ... -> stage N
+    A stage starts when the temp reaches its start temp.  If the start temp of a stage isn't higher than the one
+    before (i.e. the profile peaks in the previous stage), the previous stage must also have lasted as long as
+    the profile says, less stage_exit_lead seconds.
+    The last stage is the cooling stage: the heater is off until the end of the profile.
+    :param stage_list: list of (stage name, start time, start temp) sorted by time
+    :param stage_exit_lead: int; seconds
+    :return: dict of state name -> ReflowState
+    """
+    table = {
+        'ready': ReflowState('ready', '#003399 Ready#'),
+        'wait': ReflowState('wait', COOL_TEXT, song='TAG'),
+        'start': ReflowState('start', '#009900 Starting#', HEATER_PID, 'Start'),
+    }
+    for i, name in enumerate(('ready', 'wait', 'start')):
+        table[name].index = i
+    table['wait'].next_state = 'start'
+    table['wait'].max_temp = WAIT_TEMP
+    prev_state = table['start']
+    prev_time = prev_temp = None
+    last = len(stage_list) - 1
+    for i, (name, time, temp) in enumerate(stage_list):
+        if i == last:
+            state = ReflowState(name, COOL_TEXT, HEATER_OFF, 'SMBwater')
+            state.is_last = True
+        else:
+            text = '#{} {}#'.format(STAGE_COLORS.get(name, DEFAULT_STAGE_COLOR), name[0].upper() + name[1:])
+            state = ReflowState(name, text, HEATER_PID, 'Next')
+        prev_state.next_state = name
+        prev_state.min_temp = temp
+        if prev_temp is not None and temp <= prev_temp:
+            prev_state.min_dwell = time - prev_time - stage_exit_lead
+        state.index = len(table)
+        table[name] = state
+        prev_state, prev_time, prev_temp = state, time, temp
+    # The integration of the PID is only enabled at the peak, the stage before cooling
+    if last >= 1:
+        table[stage_list[last - 1][0]].ki_enabled = True
+    return table
+
+
+def get_state_names(table):
+    """
+    :param table: dict returned by build_state_table()
+    :return: list of the state names in the order of their index
+    """
+    names = [None] * len(table)
+    for name, state in table.items():
+        names[state.index] = name
+    return names
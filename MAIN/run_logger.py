@@ -0,0 +1,135 @@
+import ustruct
+
+# One record per control tick: ms since the start of the run, temp and setpoint in quarter degrees,
+# PID output x100, heater on/off and the index of the state
+RECORD_FORMAT = '<ihhhBB'
+RECORD_SIZE = ustruct.calcsize(RECORD_FORMAT)
+# File header: magic, version, record size, control period in ms, length of the comma separated state names
+# which follow the header, then the records till the end of the file
+HEADER_FORMAT = '<4sBBHH'
+MAGIC = b'RLOG'
+VERSION = 1
+
+
+class RunLogger:
+    def __init__(self, path='run_log.bin', capacity=64, block=16):
+        """
+        Log the control ticks of the reflow process to a binary file.
+        log() packs a record into a preallocated ring in RAM without allocating, and flush() writes
+        the ring to the file in blocks.  flush() must be called from outside the control loop,
+        e.g. by the thread refreshing the temp display, so that the flash writes never stall a tick.
+        RAM use is fixed by the ring: if flush() falls a whole ring behind, the oldest records are dropped.
+        :param path: str; the log file, overwritten by every run
+        :param capacity: int; number of records in the ring
+        :param block: int; flush() writes once this many records are pending
+        """
+        self.path = path
+        self.capacity = capacity
+        self.block = min(block, capacity)
+        self.ring = bytearray(RECORD_SIZE * capacity)
+        self.ring_mv = memoryview(self.ring)
+        self.header = b''
+        # records logged/written since start(), only log() changes written and only flush() changes flushed
+        self.written = 0
+        self.flushed = 0
+        self.dropped = 0
+        # ticks the control loop couldn't log, see OvenControl._reflow_temp_control()
+        self.errors = 0
+        self.is_running = False
+        self.new_run = False
+        self.file = None
+        # cleared by disable(), e.g. once the file system has failed
+        self.enabled = True
+
+    def start(self, period_ms, state_names):
+        """
+        Start the log of a new run, the file is (re)created by the next flush()
+        :param period_ms: int; period of the control loop
+        :param state_names: list of the state names in the order of their index
+        """
+        if not self.enabled:
+            return
+        names = ','.join(state_names).encode()
+        self.header = ustruct.pack(HEADER_FORMAT, MAGIC, VERSION, RECORD_SIZE, period_ms, len(names)) + names
+        self.written = 0
+        self.flushed = 0
+        self.dropped = 0
+        self.errors = 0
+        self.is_running = True
+        self.new_run = True
+
+    def stop(self):
+        """
+        The run is over, the next flush() writes the rest of the records and closes the file
+        """
+        self.is_running = False
+
+    def disable(self):
+        """
+        Stop logging for good, the runs from now on aren't logged
+        """
+        self.enabled = False
+        self.is_running = False
+        self.new_run = False
+        if self.file:
+            try:
+                self.file.close()
+            except OSError:
+                pass
+            self.file = None
+
+    def log(self, ms, temp_q, setpoint_q, output, heater, state):
+        """
+        Record one control tick, it doesn't allocate.  Every field is clamped to its range in the record.
+        :param ms: int; ms since the start of the run
+        :param temp_q: int; temp in quarter degrees, clamped to 16 bits
+        :param setpoint_q: int; setpoint in quarter degrees, clamped to 16 bits
+        :param output: int; PID output x100, clamped to 16 bits
+        :param heater: bool; whether the heater is on
+        :param state: int; index of the current state
+        """
+        if not self.is_running:
+            return
+        ustruct.pack_into(
+            RECORD_FORMAT, self.ring, (self.written % self.capacity) * RECORD_SIZE,
+            max(-0x40000000, min(0x3fffffff, ms)), max(-32768, min(32767, temp_q)),
+            max(-32768, min(32767, setpoint_q)), max(-32768, min(32767, output)), heater, state
+        )
+        self.written += 1
+
+    def flush(self):
+        """
+        Write the pending records to the file once a block is full, or all of them once the run is over.
+        It should be called periodically from outside the control loop.
+        :return: int; number of records written
+        """
+        if self.new_run:
+            self.new_run = False
+            if self.file:
+                self.file.close()
+            self.file = open(self.path, 'wb')
+            self.file.write(self.header)
+        if not self.file:
+            return 0
+        written = self.written
+        pending = written - self.flushed
+        if pending > self.capacity:
+            # the oldest records have been overwritten
+            self.dropped += pending - self.capacity
+            self.flushed = written - self.capacity
+            pending = self.capacity
+        if self.is_running and pending < self.block:
+            return 0
+        count = pending
+        while pending:
+            start = self.flushed % self.capacity
+            n = min(pending, self.capacity - start)
+            self.file.write(self.ring_mv[start * RECORD_SIZE:(start + n) * RECORD_SIZE])
+            self.flushed += n
+            pending -= n
+        if self.is_running:
+            self.file.flush()
+        else:
+            self.file.close()
+            self.file = None
+        return count
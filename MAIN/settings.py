@@ -0,0 +1,148 @@
+import _thread
+import uos
+import ujson
+import utime
+
+# keys changed often enough to go to the journal instead of rewriting the whole file
+JOURNAL_KEYS = ('default_alloy', 'sensor_offset')
+
+
+def _remove(path):
+    try:
+        uos.remove(path)
+    except OSError:
+        pass
+
+
+class Settings:
+    def __init__(self, path='config.json', journal_limit=32, delay_ms=1000):
+        """
+        config.json, written off the UI thread and never left half written.
+        set() only updates the dict in RAM; flush(), called periodically from outside the UI, writes the changes
+        once they have settled for delay_ms.  A change of a JOURNAL_KEYS key is appended to a small journal,
+        <path minus .json>.jnl, a change of any other key rewrites the file: to <path>.tmp first, then the old file
+        is kept as <path>.bak and the new one renamed in place.  The journal is folded into the file by the next
+        rewrite, or once it holds journal_limit entries.
+        :param path: str; the settings file
+        :param journal_limit: int; entries in the journal before the file is rewritten
+        :param delay_ms: int; a change is written once no other change came for this long
+        """
+        self.path = path
+        self.tmp_path = path + '.tmp'
+        self.bak_path = path + '.bak'
+        self.journal_path = path.rsplit('.', 1)[0] + '.jnl'
+        self.journal_limit = journal_limit
+        self.delay_ms = delay_ms
+        self.data = {}
+        # set() runs on the UI thread and flush() on another one, the changes are handed over under this lock
+        self.lock = _thread.allocate_lock()
+        # key: value of the journal keys not written yet
+        self.pending = {}
+        # whether the whole file must be rewritten
+        self.dirty = False
+        self.journal_len = 0
+        self.changed_ms = 0
+
+    def load(self):
+        """
+        Read the settings, then replay the journal.  A complete <path>.tmp means the power was lost while it replaced
+        the file, it's newer than the file and the journal.  If the file is damaged, the backup is read.
+        :return: dict; the settings, kept up to date by set()
+        """
+        for path in (self.tmp_path, self.path, self.bak_path):
+            try:
+                with open(path, 'r') as f:
+                    self.data = ujson.load(f)
+                break
+            except (OSError, ValueError):
+                pass
+        else:
+            raise OSError('No readable ' + self.path)
+        if path != self.path:
+            # bring the file back at the next flush()
+            self.dirty = True
+        if path == self.tmp_path:
+            return self.data
+        try:
+            with open(self.journal_path, 'r') as f:
+                for line in f:
+                    try:
+                        key, value = ujson.loads(line)
+                    except ValueError:
+                        # a power loss cut the last entry short
+                        break
+                    self.data[key] = value
+                    self.journal_len += 1
+        except OSError:
+            pass
+        return self.data
+
+    def get(self, key, default=None):
+        return self.data.get(key, default)
+
+    def set(self, key, value):
+        """
+        Change a setting, it's written by a later flush()
+        """
+        with self.lock:
+            if self.data.get(key) == value:
+                return
+            self.data[key] = value
+            if key in JOURNAL_KEYS:
+                self.pending[key] = value
+            else:
+                self.dirty = True
+            self.changed_ms = utime.ticks_ms()
+
+    def flush(self, force=False):
+        """
+        Write the settled changes, either to the journal or the whole file.
+        It should be called periodically from outside the UI and the control loop.
+        :param force: bool; write the changes now, however recent
+        :return: bool; whether anything was written
+        :raise OSError: if the file couldn't be written, the changes are kept for the next call
+        """
+        if not self.dirty and not self.pending:
+            return False
+        if not force and utime.ticks_diff(utime.ticks_ms(), self.changed_ms) < self.delay_ms:
+            return False
+        # the changes are taken in one go, a set() from now on is left for the next flush(); the file is written
+        # outside the lock, so that set() never waits for the flash
+        with self.lock:
+            pending, self.pending = self.pending, {}
+            text = None
+            if self.dirty or self.journal_len + len(pending) > self.journal_limit:
+                self.dirty = False
+                text = ujson.dumps(self.data)
+        try:
+            if text is not None:
+                self._write_file(text)
+            else:
+                with open(self.journal_path, 'a') as f:
+                    for key, value in pending.items():
+                        f.write(ujson.dumps([key, value]) + '\n')
+                self.journal_len += len(pending)
+        except Exception:
+            # hand the changes back for the next flush(), a newer set() of the same key wins
+            with self.lock:
+                for key, value in pending.items():
+                    if key not in self.pending:
+                        self.pending[key] = value
+                if text is not None:
+                    self.dirty = True
+            raise
+        return True
+
+    def _write_file(self, text):
+        with open(self.tmp_path, 'w') as f:
+            f.write(text)
+        # the complete .tmp holds the journal now, load() prefers it until it's renamed
+        _remove(self.journal_path)
+        self.journal_len = 0
+        # FAT can't rename over an existing file
+        _remove(self.bak_path)
+        try:
+            uos.rename(self.path, self.bak_path)
+        except OSError:
+            pass
+        uos.rename(self.tmp_path, self.path)
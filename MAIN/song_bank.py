@@ -0,0 +1,118 @@
+import ubinascii
+import ustruct
+
+# songs.bin: header, then the index of the songs, then the notes of all the songs
+MAGIC = b'SNGB'
+VERSION = 2
+# magic, version, number of songs, CRC-32 of the songs.py the bank was compiled from
+HEADER_FORMAT = '<4sBHI'
+HEADER_SIZE = ustruct.calcsize(HEADER_FORMAT)
+# per song: file offset of its notes, number of notes, length of the song name which follows
+INDEX_FORMAT = '<IHB'
+INDEX_SIZE = ustruct.calcsize(INDEX_FORMAT)
+# per note: frequency in Hz (0 for a pause), duration in ms
+NOTE_FORMAT = '<HH'
+NOTE_SIZE = ustruct.calcsize(NOTE_FORMAT)
+
+
+def file_crc(path):
+    """
+    :return: int; CRC-32 of the file, None if it's missing
+    """
+    try:
+        f = open(path, 'rb')
+    except OSError:
+        return None
+    crc = 0
+    buf = bytearray(256)
+    mv = memoryview(buf)
+    with f:
+        while True:
+            n = f.readinto(buf)
+            if not n:
+                break
+            crc = ubinascii.crc32(mv[:n], crc)
+    return crc
+
+
+def compile_songs(song_list, path, source_crc=0):
+    """
+    Compile RTTTL songs into a song bank file
+    :param song_list: list of RTTTL strings, e.g. songs.SONGS
+    :param path: str; the song bank file to write
+    :param source_crc: int; CRC-32 of the source file, see file_crc(), a changed CRC means the bank is out of date
+    """
+    from rtttl import RTTTL
+    compiled = []
+    for song in song_list:
+        notes = bytearray()
+        for freq, msec in RTTTL(song).notes():
+            notes += ustruct.pack(NOTE_FORMAT, int(freq + 0.5), min(65535, int(msec + 0.5)))
+        compiled.append((song.split(':')[0].encode(), notes))
+    offset = HEADER_SIZE + sum(INDEX_SIZE + len(name) for name, notes in compiled)
+    with open(path, 'wb') as f:
+        f.write(ustruct.pack(HEADER_FORMAT, MAGIC, VERSION, len(compiled), source_crc))
+        for name, notes in compiled:
+            f.write(ustruct.pack(INDEX_FORMAT, offset, len(notes) // NOTE_SIZE, len(name)))
+            f.write(name)
+            offset += len(notes)
+        for name, notes in compiled:
+            f.write(notes)
+
+
+class SongBank:
+    def __init__(self, path='songs.bin', source='songs.py'):
+        """
+        The songs compiled into (frequency, duration) pairs, read from flash on demand.
+        Only the index of the song names is kept in RAM.  The bank is compiled with TOOLS/build_songs.py,
+        or here from the source if it's missing or out of date.
+        :param path: str; the song bank file
+        :param source: str; the RTTTL songs it's compiled from
+        """
+        self.path = path
+        self.index = {}
+        # notes of the longest song, the size of the buffer needed by load()
+        self.max_notes = 0
+        source_crc = file_crc(source)
+        if not self._load_index(source_crc):
+            import sys
+            import songs
+            compile_songs(songs.SONGS, path, source_crc)
+            # the song strings don't stay in RAM
+            del songs
+            del sys.modules['songs']
+            self._load_index(None)
+
+    def _load_index(self, source_crc):
+        try:
+            f = open(self.path, 'rb')
+        except OSError:
+            return False
+        with f:
+            magic, version, count, compiled_crc = ustruct.unpack(HEADER_FORMAT, f.read(HEADER_SIZE))
+            if magic != MAGIC or version != VERSION:
+                return False
+            if source_crc is not None and source_crc != compiled_crc:
+                return False
+            for _ in range(count):
+                offset, note_count, name_len = ustruct.unpack(INDEX_FORMAT, f.read(INDEX_SIZE))
+                self.index[f.read(name_len).decode()] = (offset, note_count)
+                self.max_notes = max(self.max_notes, note_count)
+        return True
+
+    def load(self, name, buf):
+        """
+        Read the notes of a song into buf, NOTE_SIZE bytes per note
+        :param name: str; song name
+        :param buf: bytearray; the notes beyond its size are cut off
+        :return: int; number of notes read, 0 if the song isn't in the bank
+        """
+        entry = self.index.get(name)
+        if entry is None:
+            return 0
+        offset, count = entry
+        count = min(count, len(buf) // NOTE_SIZE)
+        with open(self.path, 'rb') as f:
+            f.seek(offset)
+            f.readinto(memoryview(buf)[:count * NOTE_SIZE])
+        return count
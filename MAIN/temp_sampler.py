@@ -0,0 +1,74 @@
+import _thread
+import ucollections
+import utime
+
+# One timestamped reading of the temp sensor.  error is None, or the sensor fault message.
+Sample = ucollections.namedtuple('Sample', ('temp', 'ticks_ms', 'error'))
+
+
+class TempSampler:
+    def __init__(self, sensor_obj):
+        """
+        Share one sensor reading between all consumers (temp control, chart, GUI temp label).
+        The control loop takes exactly one sample per tick, everyone else gets that same sample.
+        :param sensor_obj: MAX31855 or MAX6675 instance
+        """
+        self.sensor = sensor_obj
+        self.lock = _thread.allocate_lock()
+        self.latest = None
+        # the last sample taken by sample_q(), the temp in quarter degrees
+        self.temp_q = 0
+        self.ticks_ms = 0
+        self.error = None
+        self.sample()
+
+    def sample(self):
+        """
+        Read the sensor once and publish the result as the latest sample.
+        It's called once per control tick.
+        :return: Sample
+        """
+        with self.lock:
+            try:
+                sample = Sample(self.sensor.read_temp(), utime.ticks_ms(), None)
+            except Exception as e:
+                sample = Sample(0, utime.ticks_ms(), str(e))
+            self.latest = sample
+        return sample
+
+    def sample_q(self):
+        """
+        Read the sensor once, for the fixed-point control loop.
+        The reading is kept in integer fields and only packed as a Sample when get() asks for it,
+        so a good reading doesn't allocate.
+        :return: int; temp in quarter degrees, 0 on a sensor fault (see error)
+        """
+        with self.lock:
+            try:
+                self.temp_q = self.sensor.read_raw()
+                self.error = None
+            except Exception as e:
+                self.temp_q = 0
+                self.error = str(e)
+            self.ticks_ms = utime.ticks_ms()
+            self.latest = None
+        return self.temp_q
+
+    def get(self, max_age_ms):
+        """
+        Get the latest sample if it's younger than max_age_ms, otherwise take a new one.
+        While the reflow process is running, the control loop keeps the latest sample fresh.
+        :param max_age_ms: int
+        :return: Sample
+        """
+        sample = self.latest
+        if sample is None:
+            # taken by sample_q(), only the display needs it as a Sample with a float temp
+            with self.lock:
+                sample = self.latest
+                if sample is None:
+                    sample = Sample(self.temp_q * 0.25, self.ticks_ms, self.error)
+                    self.latest = sample
+        if utime.ticks_diff(utime.ticks_ms(), sample.ticks_ms) < max_age_ms:
+            return sample
+        return self.sample()
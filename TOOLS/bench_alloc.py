@@ -0,0 +1,79 @@
+"""
+Heap allocations per control tick, float control vs fixed-point control.
+
+Runs on the board only, as it counts the MicroPython heap.  Copy it to the board and, once the GUI is up
+(main.py has created oven_control), run from the REPL:
+
+    import bench_alloc
+    bench_alloc.run(oven_control)
+
+The sensor is really read, but the heater pin is left alone: during the benchmark the heater drives a dummy signal.
+The run logger is switched off, so that only the control path is counted.
+"""
+import gc
+import utime
+
+from pid import PID, PIDFixed
+
+TICKS = 500
+
+
+class _DummySignal:
+    def on(self):
+        pass
+
+    def off(self):
+        pass
+
+
+def _measure(oven_control, ticks):
+    gc.collect()
+    gc.disable()
+    try:
+        before = gc.mem_alloc()
+        for _ in range(ticks):
+            oven_control._take_sample()
+            oven_control._reflow_temp_control()
+        return gc.mem_alloc() - before
+    finally:
+        gc.enable()
+
+
+def run(oven_control, stage='soak', ticks=TICKS):
+    """
+    :param oven_control: the OvenControl created by main.py
+    :param stage: a PID controlled stage of the selected profile to run the ticks in
+    :param ticks: number of control ticks to measure
+    """
+    if oven_control.has_started:
+        print('Stop the reflow process first.')
+        return
+    heater = oven_control.oven
+    saved = (heater.signal, heater.on_change, oven_control.heater_pwm, oven_control.run_logger, oven_control.pid,
+             oven_control.FIXED_POINT, oven_control.PREHEAT_UNTIL, oven_control.PREHEAT_UNTIL_Q)
+    kp, ki, kd = oven_control.pid.k_p, oven_control.pid.k_i, oven_control.pid.k_d
+    try:
+        heater.signal = _DummySignal()
+        heater.on_change = None
+        oven_control.heater_pwm = None
+        oven_control.run_logger = None
+        # always run the PID, whatever the oven temp
+        oven_control.PREHEAT_UNTIL = oven_control.PREHEAT_UNTIL_Q = -1000
+        # enter the stage without its entry hooks, so no song is played
+        oven_control.state = oven_control.state_table[stage]
+        oven_control.oven_state = stage
+        oven_control.stage_start_time = utime.time()
+        for fixed in (False, True):
+            oven_control.FIXED_POINT = fixed
+            oven_control.pid = PIDFixed(kp, ki, kd) if fixed else PID(kp, ki, kd)
+            _measure(oven_control, 10)
+            used = _measure(oven_control, ticks)
+            print('{:<12} {:>6} bytes in {} ticks, {:.1f} bytes/tick'.format(
+                'fixed-point:' if fixed else 'float:', used, ticks, used / ticks))
+    finally:
+        (heater.signal, heater.on_change, oven_control.heater_pwm, oven_control.run_logger, oven_control.pid,
+         oven_control.FIXED_POINT, oven_control.PREHEAT_UNTIL, oven_control.PREHEAT_UNTIL_Q) = saved
+        oven_control.state = oven_control.state_table['ready']
+        oven_control.oven_state = 'ready'
+        oven_control.stage_start_time = None
+        heater.set(False)
@@ -0,0 +1,76 @@
+"""
+Heap fragmentation from switching profiles and opening the popups, before and after the switches.
+
+Runs on the board only, as it measures the MicroPython heap.  Copy it to the board and, once the GUI is up
+(main.py has created gui), run from the REPL while no reflow process is running:
+
+    import bench_heap
+    bench_heap.run(gui)
+
+For each of the free heap and the largest block that can still be allocated in one piece, it prints the value before
+and after the switches; fragmentation is the share of the free heap outside the largest block.
+"""
+import gc
+
+SWITCHES = 100
+
+
+def largest_block(limit):
+    """
+    :param limit: int; upper bound, e.g. the free heap
+    :return: int; size of the largest bytearray that can be allocated, to 64 bytes
+    """
+    low, high = 0, limit
+    while high - low > 64:
+        size = (low + high) // 2
+        try:
+            block = bytearray(size)
+            del block
+            low = size
+        except MemoryError:
+            high = size
+    return low
+
+
+def measure():
+    gc.collect()
+    free = gc.mem_free()
+    largest = largest_block(free)
+    gc.collect()
+    return free, largest
+
+
+def _print(label, free, largest):
+    print('{:<8} free: {:>8}  largest block: {:>8}  fragmentation: {:>5.1f}%'.format(
+        label, free, largest, 100 * (1 - largest / free) if free else 0))
+
+
+def run(gui, switches=SWITCHES):
+    """
+    :param gui: the GUI created by main.py
+    :param switches: number of profile switches, each also opens and closes the settings, the PID params and
+    the loop stats popups
+    """
+    if gui.has_started:
+        print('Stop the reflow process first.')
+        return
+    profiles = gui.profiles
+    alloys = profiles.get_profile_alloy_names()
+    selected = gui.profile_alloy_selector.get_selected()
+    before = measure()
+    for i in range(switches):
+        profiles.load_profile_details(alloys[i % len(alloys)])
+        gui.profile_detail_init()
+        gui.popup_settings()
+        gui.settings_popup.set_hidden(True)
+        gui.popup_pid_params()
+        gui.pid_popup[0].set_hidden(True)
+        gui.popup_loop_stats()
+        gui.text_popup[0].set_hidden(True)
+    # back to the profile selected on the GUI
+    profiles.load_profile_details(alloys[selected])
+    gui.profile_detail_init()
+    after = measure()
+    print('{} profile switches:'.format(switches))
+    _print('before', *before)
+    _print('after', *after)
@@ -0,0 +1,119 @@
+"""
+Profile tracking benchmark: runs every profile under MAIN/profiles through OvenControl against the simulated oven
+of TOOLS/sim, and reports per profile:
+    rms_error       RMS of oven temp - get_profile_temp() over the PID controlled stages, Celsius
+    overshoot       peak oven temp - peak temp of the profile, Celsius
+    above_liquidus  seconds at or above melting_point
+    ramp_violations seconds in which the oven heated faster than --max-ramp-up or cooled faster than --max-ramp-down
+    handler_avg/max control tick run time from the loop stats, in host CPU time scaled by --cpu-scale (1 by
+                    default), null with --cpu-scale 0 as the clock is then frozen while the code runs
+
+    python3 TOOLS/bench_profiles.py > before.json
+    python3 TOOLS/bench_profiles.py --mode time_proportional --fixed-point
+
+The results are printed as JSON, run it before and after a change to PID, advanced_temp_tuning or the control loop
+to compare.  The oven model can be fitted to a real oven with --gain, --tau and --dead-time.
+"""
+import argparse
+import json
+import os
+import sys
+
+TOOLS_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(TOOLS_DIR, 'sim'))
+
+from sim_oven import MAIN_DIR, Simulation  # noqa: E402
+
+
+def profile_alloys():
+    profiles_dir = os.path.join(MAIN_DIR, 'profiles')
+    alloys = []
+    for name in sorted(os.listdir(profiles_dir)):
+        if name.endswith('.json'):
+            with open(os.path.join(profiles_dir, name), 'r') as f:
+                alloys.append(json.load(f).get('alloy'))
+    return alloys
+
+
+def bench_profile(alloy, args):
+    sim = Simulation(alloy=alloy, mode=args.mode, fixed_point=args.fixed_point, sensor_type=args.sensor,
+                     noise=args.noise, cpu_scale=args.cpu_scale,
+                     gain=args.gain, tau=args.tau, dead_time=args.dead_time)
+    melting_temp = sim.profiles.get_melting_temp()
+    profile_peak = max(point[1] for point in sim.profiles.get_temp_profile())
+    counters = {'above_liquidus': 0, 'ramp_violations': 0, 'max_ramp_up': 0.0, 'max_ramp_down': 0.0}
+    last_temp = [sim.oven.temp]
+
+    def on_second(s):
+        temp = s.oven.temp
+        ramp = temp - last_temp[0]
+        last_temp[0] = temp
+        if temp >= melting_temp:
+            counters['above_liquidus'] += 1
+        if ramp > args.max_ramp_up or -ramp > args.max_ramp_down:
+            counters['ramp_violations'] += 1
+        counters['max_ramp_up'] = max(counters['max_ramp_up'], ramp)
+        counters['max_ramp_down'] = max(counters['max_ramp_down'], -ramp)
+
+    result = sim.run_reflow(args.max_time, on_second)
+    loop = result['loop']
+    if args.cpu_scale and not loop['handler_max']:
+        raise RuntimeError('{}: no control tick run time measured with --cpu-scale {}'.format(alloy, args.cpu_scale))
+    return {
+        'alloy': alloy,
+        'finished': result['finished'],
+        'duration_s': result['end_s'],
+        'rms_error': result['rms_error'],
+        'peak': result['peak'],
+        'overshoot': round(result['peak'] - profile_peak, 1),
+        'above_liquidus': counters['above_liquidus'],
+        'ramp_violations': counters['ramp_violations'],
+        'max_ramp_up': round(counters['max_ramp_up'], 2),
+        'max_ramp_down': round(counters['max_ramp_down'], 2),
+        'heater_switches': result['heater'][0],
+        'ticks': loop['ticks'],
+        'handler_avg_us': loop['handler_avg'] if args.cpu_scale else None,
+        'handler_max_us': loop['handler_max'] if args.cpu_scale else None,
+        'timeline': result['timeline'],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the profile tracking of every bundled profile')
+    parser.add_argument('--alloy', action='append', help='only bench this profile, can be repeated')
+    parser.add_argument('--mode', choices=('on_off', 'time_proportional'), help='heater control mode')
+    parser.add_argument('--fixed-point', action='store_true', default=None, help='integer control loop')
+    parser.add_argument('--sensor', choices=('MAX31855', 'MAX6675'), help='thermocouple amplifier')
+    parser.add_argument('--noise', type=float, default=0.0, help='thermocouple noise in Celsius')
+    parser.add_argument('--cpu-scale', type=float, default=1.0,
+                        help='host CPU time to virtual time factor, 0 for repeatable runs without handler times')
+    parser.add_argument('--max-time', type=int, default=900, help='virtual seconds to give up after')
+    parser.add_argument('--max-ramp-up', type=float, default=3.0, help='heating ramp limit, Celsius per second')
+    parser.add_argument('--max-ramp-down', type=float, default=6.0, help='cooling ramp limit, Celsius per second')
+    parser.add_argument('--gain', type=float, default=450.0, help='oven temp rise with the heater fully on')
+    parser.add_argument('--tau', type=float, default=120.0, help='oven time constant, seconds')
+    parser.add_argument('--dead-time', type=float, default=6.0, help='oven dead time, seconds')
+    parser.add_argument('--out', help='also write the results to this file')
+    args = parser.parse_args()
+    # the simulation runs in a copy of MAIN
+    out_path = os.path.abspath(args.out) if args.out else None
+
+    results = [bench_profile(alloy, args) for alloy in (args.alloy or profile_alloys())]
+    report = {
+        'settings': {
+            'mode': args.mode,
+            'fixed_point': args.fixed_point,
+            'cpu_scale': args.cpu_scale,
+            'oven': {'gain': args.gain, 'tau': args.tau, 'dead_time': args.dead_time},
+        },
+        'profiles': results,
+    }
+    text = json.dumps(report, indent=2)
+    print(text)
+    if out_path:
+        with open(out_path, 'w') as f:
+            f.write(text)
+
+
+if __name__ == '__main__':
+    main()
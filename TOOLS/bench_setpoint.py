@@ -0,0 +1,88 @@
+"""
+Micro-benchmark of the per-tick setpoint lookup, before and after compiling the profile
+into a setpoint table.
+
+Runs under MicroPython (copy it next to load_profiles.py on the board and `import bench_setpoint`)
+or on a Linux host from the repo root: python3 TOOLS/bench_setpoint.py
+"""
+import sys
+
+try:
+    import uos
+    from utime import ticks_us, ticks_diff
+except ImportError:
+    # CPython host: map the MicroPython module names and run from the MAIN folder
+    import array
+    import binascii
+    import json
+    import os
+    import time
+    sys.modules.update(uos=os, ujson=json, uarray=array, ubinascii=binascii)
+    main_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'MAIN')
+    sys.path.insert(0, main_dir)
+    os.chdir(main_dir)
+
+    def ticks_us():
+        return time.perf_counter_ns() // 1000
+
+    def ticks_diff(new, old):
+        return new - old
+
+from load_profiles import LoadProfiles
+
+PROFILES = ('Sn63/Pb37', 'Sn42/Bi57.6/Ag0.4', 'Sn96.5/Ag3.0/Cu0.5')
+ROUNDS = 5
+
+
+def linear_profile_temp(profiles, seconds):
+    """The lookup as it was before: walk the profile points on every call"""
+    x1 = profiles.get_temp_profile()[0][0]
+    y1 = profiles.get_temp_profile()[0][1]
+    for point in profiles.get_temp_profile():
+        x2 = point[0]
+        y2 = point[1]
+        if x1 <= seconds < x2:
+            temp = y1 + (y2 - y1) * (seconds - x1) // (x2 - x1)
+            return temp
+        x1 = x2
+        y1 = y2
+    return 0
+
+
+def table_profile_temp(table, seconds):
+    """The lookup as done by OvenControl.get_profile_temp now"""
+    if 0 <= seconds < len(table):
+        return table[seconds]
+    return 0
+
+
+def bench(profiles, alloy):
+    profiles.load_profile_details(alloy)
+    table = profiles.get_setpoint_table()
+    end = profiles.get_time_range()[-1] + 10
+    # a smooth profile curves between its points, the old lookup didn't
+    for sec in range(end if profiles.profile_details.get('interpolation') == 'linear' else 0):
+        if linear_profile_temp(profiles, sec) != table_profile_temp(table, sec):
+            raise ValueError('{}: setpoint mismatch at {}s'.format(alloy, sec))
+    lookups = end * ROUNDS
+    start = ticks_us()
+    for _ in range(ROUNDS):
+        for sec in range(end):
+            linear_profile_temp(profiles, sec)
+    before = ticks_diff(ticks_us(), start) / lookups
+    start = ticks_us()
+    for _ in range(ROUNDS):
+        for sec in range(end):
+            table_profile_temp(table, sec)
+    after = ticks_diff(ticks_us(), start) / lookups
+    print('{:<20} points:{:>3}  linear:{:>8.2f}us  table:{:>6.2f}us  speedup:{:>5.1f}x'.format(
+        alloy, len(profiles.get_temp_profile()), before, after, before / after if after else 0))
+
+
+def main():
+    profiles = LoadProfiles(PROFILES[0])
+    for alloy in PROFILES:
+        bench(profiles, alloy)
+
+
+main()
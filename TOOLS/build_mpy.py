@@ -0,0 +1,179 @@
+"""
+Cross-compiles the modules under MAIN to .mpy bytecode, so that the board doesn't compile them from source at every
+boot, and reports per module the source size, the bytecode size and the import time.
+
+    python3 TOOLS/build_mpy.py
+    python3 TOOLS/build_mpy.py --mpy-cross ~/lv_micropython/mpy-cross/mpy-cross --out build/mpy
+    python3 TOOLS/build_mpy.py --manifest build/manifest.py
+
+--out gets a copy of MAIN ready to upload, with every module but main.py replaced by its .mpy.  mpy-cross must be
+built from the same MicroPython version as the firmware (1.12, .mpy version 5), it's looked up on the PATH by default.
+
+The import times are measured on the host with CPython under the stand-ins of TOOLS/sim/stubs, once from source
+and once from precompiled bytecode, for each module on its own without the modules it imports: they rank the modules
+and show what the compile step costs, not the time on the ESP32.  A module whose imports have no stand-in, e.g. uftpd,
+shows no time.
+
+--manifest writes a manifest to freeze the modules into the firmware instead:
+    make -C ports/esp32 FROZEN_MANIFEST=/path/to/manifest.py
+"""
+import argparse
+import compileall
+import json
+import os
+import re
+import shutil
+import subprocess
+import sys
+import tempfile
+
+TOOLS_DIR = os.path.dirname(os.path.abspath(__file__))
+MAIN_DIR = os.path.abspath(os.path.join(TOOLS_DIR, '..', 'MAIN'))
+SIM_DIR = os.path.join(TOOLS_DIR, 'sim')
+# run as scripts by the firmware, they stay as source
+SCRIPTS = ('boot.py', 'main.py')
+# made on the board
+GENERATED = ('profile_index.json',)
+
+
+def list_modules():
+    return sorted(name for name in os.listdir(MAIN_DIR) if name.endswith('.py') and name not in SCRIPTS)
+
+
+def find_mpy_cross(path):
+    path = path or shutil.which('mpy-cross')
+    if not path or not os.path.exists(path):
+        return None
+    return path
+
+
+def mpy_cross_version(mpy_cross):
+    result = subprocess.run([mpy_cross, '--version'], capture_output=True, text=True)
+    return (result.stdout or result.stderr).strip()
+
+
+def build(mpy_cross, out_dir):
+    """
+    Copy MAIN to out_dir, with the modules compiled by mpy-cross
+    :return: dict of module name: .mpy size
+    """
+    if os.path.exists(out_dir):
+        shutil.rmtree(out_dir)
+    os.makedirs(out_dir)
+    sizes = {}
+    for name in sorted(os.listdir(MAIN_DIR)):
+        src = os.path.join(MAIN_DIR, name)
+        if name in GENERATED or name == '__pycache__' or name.endswith('.pyc'):
+            continue
+        if os.path.isdir(src):
+            shutil.copytree(src, os.path.join(out_dir, name))
+        elif name.endswith('.py') and name not in SCRIPTS:
+            dst = os.path.join(out_dir, name[:-3] + '.mpy')
+            subprocess.run([mpy_cross, '-s', name, '-o', dst, src], check=True)
+            sizes[name[:-3]] = os.path.getsize(dst)
+        else:
+            shutil.copy(src, os.path.join(out_dir, name))
+    return sizes
+
+
+def import_times(modules, bytecode, repeat=3):
+    """
+    Import each module in a fresh CPython process and parse the -X importtime report
+    :param bytecode: bool; import from precompiled .pyc files, otherwise from source with no cache
+    :param repeat: int; the best of this many imports is kept
+    :return: dict of module name: import time in us of the module itself, without the modules it imports,
+    None if the import failed
+    """
+    work_dir = tempfile.mkdtemp(prefix='build_mpy_')
+    try:
+        for name in modules:
+            shutil.copy(os.path.join(MAIN_DIR, name + '.py'), work_dir)
+        if bytecode:
+            compileall.compile_dir(work_dir, quiet=1)
+        times = {}
+        for module in modules:
+            code = 'import sys; sys.path[:0] = {!r}; import simclock; import {}'.format(
+                [os.path.join(SIM_DIR, 'stubs'), SIM_DIR, work_dir], module)
+            args = [sys.executable, '-X', 'importtime']
+            if not bytecode:
+                args.append('-B')
+            times[module] = None
+            for _ in range(repeat):
+                result = subprocess.run(args + ['-c', code], cwd=work_dir, capture_output=True, text=True)
+                if result.returncode:
+                    break
+                for line in result.stderr.splitlines():
+                    match = re.match(r'import time:\s+(\d+) \|\s+\d+ \|\s*(\S+)$', line)
+                    if match and match.group(2) == module:
+                        us = int(match.group(1))
+                        times[module] = us if times[module] is None else min(times[module], us)
+        return times
+    finally:
+        shutil.rmtree(work_dir)
+
+
+def write_manifest(path, modules):
+    lines = [
+        '# Generated by TOOLS/build_mpy.py: the firmware modules plus the modules under MAIN',
+        'include("$(PORT_DIR)/boards/manifest.py")',
+        'freeze({!r}, ('.format(MAIN_DIR),
+    ]
+    lines += ['    {!r},'.format(name) for name in modules]
+    lines.append('))')
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path, 'w') as f:
+        f.write('\n'.join(lines) + '\n')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compile MAIN to .mpy and report the size and import time per module')
+    parser.add_argument('--mpy-cross', help='path of mpy-cross, looked up on the PATH by default')
+    parser.add_argument('--out', default='build/mpy', help='folder to write the compiled copy of MAIN to')
+    parser.add_argument('--manifest', help='also write a manifest to freeze the modules into the firmware')
+    parser.add_argument('--no-times', action='store_true', help='skip measuring the import times')
+    parser.add_argument('--json', action='store_true', help='print the report as JSON')
+    args = parser.parse_args()
+
+    modules = list_modules()
+    mpy_cross = find_mpy_cross(args.mpy_cross)
+    mpy_sizes = {}
+    if mpy_cross:
+        print('{}, writing {}'.format(mpy_cross_version(mpy_cross), args.out), file=sys.stderr)
+        mpy_sizes = build(mpy_cross, args.out)
+    else:
+        print('mpy-cross not found, no .mpy built: pass --mpy-cross or put it on the PATH', file=sys.stderr)
+    names = [name[:-3] for name in modules]
+    source_times = bytecode_times = {}
+    if not args.no_times:
+        source_times = import_times(names, bytecode=False)
+        bytecode_times = import_times(names, bytecode=True)
+    if args.manifest:
+        write_manifest(args.manifest, modules)
+
+    report = []
+    for name in names:
+        report.append({
+            'module': name,
+            'source_bytes': os.path.getsize(os.path.join(MAIN_DIR, name + '.py')),
+            'mpy_bytes': mpy_sizes.get(name),
+            'import_source_us': source_times.get(name),
+            'import_bytecode_us': bytecode_times.get(name),
+        })
+    if args.json:
+        print(json.dumps(report, indent=2))
+        return
+
+    def column(value):
+        return '-' if value is None else value
+
+    print('{:<16}{:>10}{:>10}{:>14}{:>16}'.format('module', 'source B', 'mpy B', 'import src us', 'import bytec us'))
+    for row in report:
+        print('{:<16}{:>10}{:>10}{:>14}{:>16}'.format(
+            row['module'], row['source_bytes'], column(row['mpy_bytes']),
+            column(row['import_source_us']), column(row['import_bytecode_us'])))
+    print('{:<16}{:>10}{:>10}'.format(
+        'total', sum(row['source_bytes'] for row in report), sum(mpy_sizes.values()) if mpy_sizes else '-'))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,33 @@
+"""
+Compiles the profiles under MAIN/profiles into MAIN/profiles_bin, read by MAIN/load_profiles.py.
+
+    python3 TOOLS/build_profiles.py
+
+Run it after adding or editing a profile, and upload profiles_bin along with it.  If a compiled profile is missing or
+out of date, the board compiles it on its own when the profile is selected.
+"""
+import array
+import binascii
+import json
+import os
+import sys
+
+main_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'MAIN')
+sys.modules.update(uos=os, ujson=json, uarray=array, ubinascii=binascii)
+sys.path.insert(0, main_dir)
+
+import load_profiles  # noqa: E402
+
+
+def main():
+    os.chdir(main_dir)
+    for name in sorted(os.listdir(load_profiles.PROFILE_DIR)):
+        if not name.endswith('.json'):
+            continue
+        load_profiles.compile_profile(name, load_profiles.file_crc(os.path.join(load_profiles.PROFILE_DIR, name)))
+        path = os.path.join(load_profiles.PROFILE_BIN_DIR, name[:-5] + '.bin')
+        print('{}: {} bytes'.format(path, os.stat(path).st_size))
+
+
+if __name__ == '__main__':
+    main()
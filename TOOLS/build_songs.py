@@ -0,0 +1,32 @@
+"""
+Compiles the RTTTL songs of MAIN/songs.py into the song bank MAIN/songs.bin read by MAIN/buzzer.py.
+
+    python3 TOOLS/build_songs.py
+
+Run it after editing songs.py, and upload songs.bin along with it.  If songs.bin is missing or out of date,
+the board compiles it on its own at boot, which takes longer and needs the RAM for all the songs once.
+"""
+import binascii
+import os
+import struct
+import sys
+
+main_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'MAIN')
+sys.modules.update(uos=os, ustruct=struct, ubinascii=binascii)
+sys.path.insert(0, main_dir)
+
+import song_bank  # noqa: E402
+import songs  # noqa: E402
+
+
+def main():
+    source = os.path.join(main_dir, 'songs.py')
+    path = os.path.join(main_dir, 'songs.bin')
+    song_bank.compile_songs(songs.SONGS, path, song_bank.file_crc(source))
+    bank = song_bank.SongBank(path, source)
+    print('{} songs, {} bytes (songs.py: {} bytes), longest song: {} notes'.format(
+        len(bank.index), os.stat(path).st_size, os.stat(source).st_size, bank.max_notes))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,57 @@
+"""
+Converts the binary run log written by MAIN/run_logger.py to CSV.
+
+    python3 TOOLS/read_run_log.py run_log.bin > run.csv
+
+Copy run_log.bin from the board over FTP first.  Columns: seconds since the start of the run, temp and setpoint
+in Celsius, PID output, heater on/off and the state of the reflow process.
+"""
+import csv
+import struct
+import sys
+
+# keep in sync with MAIN/run_logger.py
+RECORD_FORMAT = '<ihhhBB'
+HEADER_FORMAT = '<4sBBHH'
+MAGIC = b'RLOG'
+
+
+def read_run_log(path):
+    """
+    :return: (period_ms, list of dicts, one per control tick)
+    """
+    with open(path, 'rb') as f:
+        data = f.read()
+    header_size = struct.calcsize(HEADER_FORMAT)
+    magic, version, record_size, period_ms, names_len = struct.unpack_from(HEADER_FORMAT, data)
+    if magic != MAGIC:
+        raise ValueError('{} is not a run log'.format(path))
+    if record_size != struct.calcsize(RECORD_FORMAT):
+        raise ValueError('Unsupported run log version {}'.format(version))
+    names = data[header_size:header_size + names_len].decode().split(',')
+    records = []
+    for ms, temp_q, setpoint_q, output, heater, state in struct.iter_unpack(
+            RECORD_FORMAT, data[header_size + names_len:][:(len(data) - header_size - names_len) // record_size
+                                                         * record_size]):
+        records.append({
+            'time': ms / 1000,
+            'temp': temp_q / 4,
+            'setpoint': setpoint_q / 4,
+            'output': output / 100,
+            'heater': heater,
+            'state': names[state] if state < len(names) else state,
+        })
+    return period_ms, records
+
+
+def main():
+    if len(sys.argv) != 2:
+        sys.exit('Usage: python3 read_run_log.py run_log.bin > run.csv')
+    period_ms, records = read_run_log(sys.argv[1])
+    writer = csv.DictWriter(sys.stdout, fieldnames=('time', 'temp', 'setpoint', 'output', 'heater', 'state'))
+    writer.writeheader()
+    writer.writerows(records)
+
+
+if __name__ == '__main__':
+    main()
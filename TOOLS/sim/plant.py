@@ -0,0 +1,99 @@
+"""Simulated oven: a first-order-plus-dead-time thermal model and the thermocouple amplifier reading it"""
+import random
+
+import machine
+import simclock
+
+
+class Oven:
+    # integration step of the thermal model
+    STEP_US = 20000
+
+    def __init__(self, heater_pin, ambient=25.0, gain=450.0, tau=120.0, dead_time=6.0, temp=None):
+        """
+        The heater SSR is watched on its GPIO pin, the model is stepped whenever the virtual clock moves.
+        :param heater_pin: int; GPIO number of the heater SSR, the level is taken as active high
+        :param ambient: room temp in Celsius
+        :param gain: steady-state rise in Celsius above ambient with the heater fully on
+        :param tau: time constant in seconds
+        :param dead_time: seconds between a heater switch and the first effect on the thermocouple
+        :param temp: starting temp in Celsius, ambient by default
+        """
+        self.ambient = ambient
+        self.gain = gain
+        self.tau = tau
+        self.dead_time_us = int(dead_time * 1000000)
+        self.temp = ambient if temp is None else temp
+        self.heater = 0
+        # (time_us, level) of the heater switches within the dead time, oldest first
+        self.switches = []
+        self.heater_on_us = 0
+        machine.watch_pin(heater_pin, self._heater_changed)
+        simclock.hooks.append(self.step)
+
+    def _heater_changed(self, level):
+        if level != self.heater:
+            self.heater = level
+            self.switches.append((simclock.now_us, level))
+
+    def _heater_at(self, t_us):
+        level = 0
+        for when, value in self.switches:
+            if when > t_us:
+                break
+            level = value
+        return level
+
+    def step(self, old_us, new_us):
+        t = old_us
+        while t < new_us:
+            dt_us = min(self.STEP_US, new_us - t)
+            u = self._heater_at(t - self.dead_time_us)
+            if self._heater_at(t):
+                self.heater_on_us += dt_us
+            self.temp += (self.ambient + self.gain * u - self.temp) * (dt_us / 1000000) / self.tau
+            t += dt_us
+        # drop the switches older than the dead time, keeping the level in force
+        while len(self.switches) > 1 and self.switches[1][0] < new_us - self.dead_time_us:
+            self.switches.pop(0)
+
+
+class Thermocouple:
+    def __init__(self, oven, cs_pin, sensor_type='MAX31855', noise=0.0, seed=0):
+        """
+        Answers the SPI reads of the sensor driver like a MAX31855 or a MAX6675 would.
+        :param oven: Oven; the temp source
+        :param cs_pin: int; GPIO number of the chip select of the sensor
+        :param sensor_type: str; 'MAX31855' or 'MAX6675'
+        :param noise: standard deviation in Celsius of the gaussian noise added to each reading
+        :param seed: seed of the noise, keeps runs repeatable
+        """
+        self.oven = oven
+        self.sensor_type = sensor_type
+        self.noise = noise
+        self.random = random.Random(seed)
+        # set to True to simulate an open thermocouple
+        self.open_circuit = False
+        self.reads = 0
+        machine.attach_spi_device(cs_pin, self)
+
+    def read(self, buf):
+        self.reads += 1
+        temp = self.oven.temp
+        if self.noise:
+            temp += self.random.gauss(0, self.noise)
+        quarters = int(round(temp * 4))
+        if self.sensor_type == 'MAX6675':
+            # D14-D3 temp in 0.25 degrees, D2 open thermocouple
+            word = (max(0, quarters) & 0xFFF) << 3
+            if self.open_circuit:
+                word |= 0x04
+            buf[0] = word >> 8
+            buf[1] = word & 0xFF
+        else:
+            # D31-D18 temp in 0.25 degrees, D16 fault, D15-D4 cold junction in 0.0625 degrees, D0 open circuit
+            word = ((quarters & 0x3FFF) << 18) | ((int(self.oven.ambient * 16) & 0xFFF) << 4)
+            if self.open_circuit:
+                word |= 0x10001
+            for i in range(4):
+                buf[i] = (word >> (24 - 8 * i)) & 0xFF
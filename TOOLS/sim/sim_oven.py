@@ -0,0 +1,288 @@
+"""
+Runs the unmodified code under MAIN against a simulated oven on the host, faster than real time.
+
+machine, utime, micropython and lvgl are replaced by the stand-ins under stubs, which run on the
+virtual clock of simclock.  The heater SSR drives the thermal model of plant.Oven, and the sensor
+driver reads the thermocouple of plant.Thermocouple over the fake SPI bus.
+
+    python3 TOOLS/sim/sim_oven.py --alloy Sn63/Pb37
+    python3 TOOLS/sim/sim_oven.py --mode time_proportional --fixed-point --json
+    python3 TOOLS/sim/sim_oven.py --autotune
+
+MAIN is copied to a temp folder first, so that the files written during a run, e.g. config.json
+and loop_stats.json, don't touch the repo.  The folder is removed at exit, pass --run-log to keep
+the run log:
+
+    python3 TOOLS/sim/sim_oven.py --run-log run_log.bin
+"""
+import argparse
+import atexit
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+SIM_DIR = os.path.dirname(os.path.abspath(__file__))
+MAIN_DIR = os.path.join(SIM_DIR, '..', '..', 'MAIN')
+sys.path.insert(0, os.path.join(SIM_DIR, 'stubs'))
+sys.path.insert(0, SIM_DIR)
+
+import machine  # noqa: E402
+import simclock  # noqa: E402
+import plant  # noqa: E402
+
+_work_dir = None
+
+
+def _enter_work_dir():
+    global _work_dir
+    if _work_dir is None:
+        _work_dir = tempfile.mkdtemp(prefix='reflow_sim_')
+        # the files of the runs go with it, see --run-log to keep the run log
+        atexit.register(shutil.rmtree, _work_dir, True)
+        for name in os.listdir(MAIN_DIR):
+            src = os.path.join(MAIN_DIR, name)
+            if os.path.isdir(src):
+                shutil.copytree(src, os.path.join(_work_dir, name))
+            elif not name.endswith('.pyc'):
+                shutil.copy(src, os.path.join(_work_dir, name))
+        sys.path.insert(2, _work_dir)
+    os.chdir(_work_dir)
+    # every simulation starts from the config.json of the repo
+    for name in ('config.json.tmp', 'config.json.bak', 'config.jnl'):
+        if os.path.exists(name):
+            os.remove(name)
+    shutil.copy(os.path.join(MAIN_DIR, 'config.json'), 'config.json')
+    return _work_dir
+
+
+class Simulation:
+    def __init__(self, alloy=None, mode=None, fixed_point=None, sensor_type=None, noise=0.0, cpu_scale=0,
+                 display=True, **oven_kwargs):
+        """
+        Build the objects the way main.py does, on a fresh virtual clock.
+        :param alloy: str; the profile to select, default_alloy of config.json by default
+        :param mode: str; overrides heater_control.mode of config.json
+        :param fixed_point: bool; overrides heater_control.fixed_point of config.json
+        :param sensor_type: str; overrides sensor_type of config.json
+        :param noise: standard deviation in Celsius of the thermocouple noise
+        :param cpu_scale: host CPU time is scaled by this factor onto the virtual clock, see simclock.cpu_scale
+        :param display: whether to emulate the display thread reading the temp
+        :param oven_kwargs: params of the thermal model, see plant.Oven
+        """
+        self.work_dir = _enter_work_dir()
+        simclock.reset()
+        simclock.cpu_scale = cpu_scale
+        machine.reset_hardware()
+
+        from settings import Settings
+        self.settings = Settings('config.json')
+        config = self.settings.load()
+        heater_control = config.setdefault('heater_control', {})
+        if mode is not None:
+            heater_control['mode'] = mode
+        if fixed_point is not None:
+            heater_control['fixed_point'] = fixed_point
+        if sensor_type is not None:
+            config['sensor_type'] = sensor_type
+        if alloy is not None:
+            config['default_alloy'] = alloy
+        self.config = config
+
+        from buzzer import Buzzer
+        from gui import GUI
+        from heater import Heater, HeaterPWM
+        from load_profiles import LoadProfiles
+        from oven_control import OvenControl
+        from pid import PID, PIDFixed
+        from run_logger import RunLogger
+        from temp_sampler import TempSampler
+        if config.get('sensor_type') == 'MAX6675':
+            from max6675 import MAX6675 as Sensor
+        else:
+            from max31855 import MAX31855 as Sensor
+
+        self.oven = plant.Oven(config['heater_pins']['heater'], **oven_kwargs)
+        self.thermocouple = plant.Thermocouple(self.oven, config['sensor_pins']['cs'],
+                                               sensor_type=config.get('sensor_type', 'MAX31855'), noise=noise)
+
+        self.profiles = LoadProfiles(config['default_alloy'])
+        self.sensor = Sensor(
+            hwspi=config['sensor_pins']['hwspi'],
+            cs=config['sensor_pins']['cs'],
+            miso=config['sensor_pins']['miso'],
+            sck=config['sensor_pins']['sck'],
+            offset=config['sensor_offset']
+        )
+        self.sampler = TempSampler(self.sensor)
+        # the SSR level is what the thermal model sees, so the pin is driven active high here
+        self.heater = Heater(machine.Signal(machine.Pin(config['heater_pins']['heater'], machine.Pin.OUT)))
+        self.heater_pwm = None
+        if heater_control.get('mode') == 'time_proportional':
+            self.heater_pwm = HeaterPWM(
+                self.heater,
+                machine.Timer(1),
+                machine.Timer(2),
+                window_ms=heater_control.get('window_ms', 2000),
+                min_switch_ms=heater_control.get('min_switch_ms', 20)
+            )
+        self.buzzer = Buzzer(config['buzzer_pin'], machine.Timer(3))
+        self.run_logger = None
+        run_log = config.get('run_log', {})
+        if run_log.get('enable'):
+            self.run_logger = RunLogger(
+                run_log.get('file', 'run_log.bin'),
+                capacity=run_log.get('ring_records', 64),
+                block=run_log.get('block_records', 16)
+            )
+        if heater_control.get('fixed_point'):
+            self.pid = PIDFixed(config['pid']['kp'], config['pid']['ki'], config['pid']['kd'])
+        else:
+            self.pid = PID(config['pid']['kp'], config['pid']['ki'], config['pid']['kd'])
+        self.gui = GUI(self.profiles, self.settings, self.pid, self.sensor)
+        self.gui.profile_alloy_selector.set_selected(
+            self.profiles.get_profile_alloy_names().index(config['default_alloy']))
+        self.autotune_result = None
+        self.gui.popup_autotune_result = self._autotune_result
+        self.oven_control = OvenControl(self.heater, self.sampler, self.pid, self.profiles, self.gui, self.buzzer,
+                                        machine.Timer(0), config, self.heater_pwm, self.run_logger)
+        self.buzzer.preload(self.oven_control.get_song_names())
+        # stands in for the LVGL task applying the queued GUI updates
+        self.frame_timer = machine.Timer(6)
+        self.frame_timer.init(period=GUI.FRAME_MS, mode=machine.Timer.PERIODIC,
+                              callback=lambda t: self.gui.process_updates())
+        if display:
+            # stands in for the measure_temp thread of main.py
+            display_ms = int(1000 / config['display_refresh_hz'])
+            self.display_timer = machine.Timer(5)
+            self.display_timer.init(period=display_ms, mode=machine.Timer.PERIODIC,
+                                    callback=lambda t: self._display_update(display_ms))
+
+    def _display_update(self, display_ms):
+        self.gui.temp_update(self.sampler.get(display_ms).temp)
+        if self.run_logger:
+            self.run_logger.flush()
+        self.settings.flush()
+
+    def _autotune_result(self, gains, error=None):
+        self.autotune_result = (gains, error)
+
+    def _run(self, max_s, on_second):
+        start_wall = time.perf_counter()
+        self.timeline = []
+        while simclock.now_us < max_s * 1000000:
+            simclock.advance(1000000)
+            state = self.oven_control.oven_state
+            if not self.timeline or self.timeline[-1][1] != state:
+                self.timeline.append((simclock.now_us // 1000000, state, round(self.oven.temp, 1)))
+            if on_second:
+                on_second(self)
+            if not self.gui.has_started:
+                break
+        self.wall_s = time.perf_counter() - start_wall
+        return simclock.now_us // 1000000
+
+    def run_reflow(self, max_s=900, on_second=None):
+        """
+        Click Start and run until the reflow process finishes or max_s of virtual time.
+        :param on_second: callable(simulation) called after every virtual second
+        :return: dict of the outcome
+        """
+        pid_stages = [stage[0] for stage in self.profiles.get_stage_list()[:-1]]
+        self._err2 = 0.0
+        self._err_n = 0
+        self.peak = self.oven.temp
+
+        def track(sim):
+            sim.peak = max(sim.peak, sim.oven.temp)
+            oc = sim.oven_control
+            if oc.oven_state in pid_stages and oc.stage_timediff:
+                sim._err2 += (sim.oven.temp - oc.get_profile_temp(oc.stage_timediff)) ** 2
+                sim._err_n += 1
+            if on_second:
+                on_second(sim)
+
+        self.gui.set_reflow_process_on(True)
+        end_s = self._run(max_s, track)
+        if self.run_logger:
+            # the display thread would write the rest of the run log shortly
+            self.run_logger.flush()
+        return {
+            'alloy': self.config['default_alloy'],
+            'finished': not self.gui.has_started,
+            'end_s': end_s,
+            'timeline': self.timeline,
+            'rms_error': round((self._err2 / max(self._err_n, 1)) ** 0.5, 2),
+            'peak': round(self.peak, 1),
+            'spi_reads': self.thermocouple.reads,
+            'heater_on_s': self.oven.heater_on_us // 1000000,
+            'heater': self.heater.get_stats(),
+            'loop': self.oven_control.loop_stats.get_summary(),
+            'run_log': os.path.join(self.work_dir, self.run_logger.path) if self.run_logger else None,
+            'speedup': round(end_s / self.wall_s) if self.wall_s else None,
+        }
+
+    def run_autotune(self, max_s=3600, on_second=None):
+        """
+        Start Auto-Tune and run until it finishes or max_s of virtual time.
+        :return: dict of the outcome
+        """
+        self.gui.set_autotune_on()
+        end_s = self._run(max_s, on_second)
+        gains, error = self.autotune_result or (None, 'Not finished')
+        return {
+            'end_s': end_s,
+            'gains': gains,
+            'error': error,
+            'spi_reads': self.thermocouple.reads,
+            'speedup': round(end_s / self.wall_s) if self.wall_s else None,
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Run a reflow process against a simulated oven')
+    parser.add_argument('--alloy', help='profile to run, default_alloy of config.json by default')
+    parser.add_argument('--mode', choices=('on_off', 'time_proportional'), help='heater control mode')
+    parser.add_argument('--fixed-point', action='store_true', default=None, help='integer control loop')
+    parser.add_argument('--sensor', choices=('MAX31855', 'MAX6675'), help='thermocouple amplifier')
+    parser.add_argument('--noise', type=float, default=0.0, help='thermocouple noise in Celsius')
+    parser.add_argument('--cpu-scale', type=float, default=0, help='host CPU time to virtual time factor')
+    parser.add_argument('--max-time', type=int, default=900, help='virtual seconds to give up after')
+    parser.add_argument('--autotune', action='store_true',
+                        help='run Auto-Tune instead of a reflow process, in the time_proportional mode by default')
+    parser.add_argument('--run-log', help='keep the run log in this file, the work folder is removed at exit')
+    parser.add_argument('--json', action='store_true', help='print the outcome as JSON')
+    args = parser.parse_args()
+    # the simulation runs in a copy of MAIN
+    run_log_path = os.path.abspath(args.run_log) if args.run_log else None
+    if args.autotune and not args.mode:
+        # Auto-Tune refuses the on_off mode
+        args.mode = 'time_proportional'
+
+    sim = Simulation(alloy=args.alloy, mode=args.mode, fixed_point=args.fixed_point, sensor_type=args.sensor,
+                     noise=args.noise, cpu_scale=args.cpu_scale)
+    if args.autotune:
+        result = sim.run_autotune(args.max_time)
+    else:
+        result = sim.run_reflow(args.max_time)
+        if result['run_log'] and run_log_path:
+            shutil.copy(result['run_log'], run_log_path)
+        result['run_log'] = run_log_path if result['run_log'] else None
+    if args.json:
+        print(json.dumps(result))
+        return
+    for key, value in result.items():
+        if key == 'timeline':
+            print('timeline:')
+            for sec, state, temp in value:
+                print('  {:>5}s  {:<10} {:.1f}'.format(sec, state, temp))
+        else:
+            print('{}: {}'.format(key, value))
+    if not args.autotune:
+        print(sim.oven_control.get_loop_stats_text())
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,112 @@
+"""
+Virtual clock shared by the utime, machine and micropython stand-ins.
+
+Time only moves when advance() or run_until() is called: timers fire at their due time,
+then the callbacks queued by micropython.schedule() run, just like on the ESP32.
+"""
+import heapq
+import time
+
+# the micropython.schedule() queue depth of the ESP32 port
+SCHEDULE_DEPTH = 8
+
+now_us = 0
+# Host CPU time is scaled by this factor and added to the clock while a callback runs,
+# so that the code sees its own run time in ticks_us(); 0 leaves the clock frozen during callbacks.
+cpu_scale = 0
+# callables run with (old_us, new_us) whenever the clock moves forward, e.g. the thermal plant
+hooks = []
+_timers = []  # heap of (due_us, seq, timer)
+_seq = 0
+_scheduled = []
+# perf_counter() when the running callback started, None outside callbacks
+_cpu_mark = None
+# the last time returned by now(), which must never go back
+_last_now = 0
+
+
+def add_timer(due_us, timer):
+    global _seq
+    _seq += 1
+    heapq.heappush(_timers, (due_us, _seq, timer))
+
+
+def schedule(func, arg):
+    if len(_scheduled) >= SCHEDULE_DEPTH:
+        raise RuntimeError('schedule queue full')
+    _scheduled.append((func, arg))
+
+
+def cpu_us():
+    """
+    Scaled host CPU time since the running callback started, 0 outside callbacks
+    """
+    if not cpu_scale or _cpu_mark is None:
+        return 0
+    return int((time.perf_counter() - _cpu_mark) * 1000000 * cpu_scale)
+
+
+def now():
+    """
+    The clock as seen by the code under test, including the run time of the current callback
+    """
+    global _last_now
+    us = now_us + cpu_us()
+    if us < _last_now:
+        raise RuntimeError('virtual clock went back from {}us to {}us'.format(_last_now, us))
+    _last_now = us
+    return us
+
+
+def _call(func, arg):
+    global _cpu_mark
+    outer_mark = _cpu_mark
+    _cpu_mark = time.perf_counter()
+    try:
+        func(arg)
+        if cpu_scale:
+            _set_now(now())
+    finally:
+        # a callback may sleep and so run other callbacks, the time after it counts for the one that called it
+        _cpu_mark = outer_mark
+
+
+def _run_scheduled():
+    while _scheduled:
+        func, arg = _scheduled.pop(0)
+        _call(func, arg)
+
+
+def advance(us):
+    run_until(now_us + us)
+
+
+def run_until(end_us):
+    while _timers and _timers[0][0] <= end_us:
+        due, _, timer = heapq.heappop(_timers)
+        if not timer.armed(due):
+            continue
+        _set_now(due)
+        _call(timer.fire, due)
+        _run_scheduled()
+    _set_now(end_us)
+    _run_scheduled()
+
+
+def _set_now(us):
+    global now_us
+    if us > now_us:
+        for hook in hooks:
+            hook(now_us, us)
+        now_us = us
+
+
+def reset():
+    global now_us, cpu_scale, _cpu_mark, _last_now
+    now_us = 0
+    cpu_scale = 0
+    _cpu_mark = None
+    _last_now = 0
+    del _timers[:]
+    del _scheduled[:]
+    del hooks[:]
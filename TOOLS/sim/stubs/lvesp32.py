@@ -0,0 +1 @@
+"""lvesp32 stand-in: the LVGL task handler is not needed without a display"""
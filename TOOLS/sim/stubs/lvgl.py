@@ -0,0 +1,121 @@
+"""Permissive lvgl stand-in: widgets remember set_x() values so get_x() returns them"""
+_namespaces = {}
+
+
+class _Namespace:
+    def __init__(self, path):
+        self._path = path
+
+    def __getattr__(self, name):
+        if name.startswith('__'):
+            raise AttributeError(name)
+        return _ns(self._path + '.' + name)
+
+    def __call__(self, *args, **kwargs):
+        return None
+
+    def __or__(self, other):
+        return self
+
+    def __repr__(self):
+        return self._path
+
+
+def _ns(path):
+    if path not in _namespaces:
+        _namespaces[path] = _Namespace(path)
+    return _namespaces[path]
+
+
+class _Struct:
+    def __getattr__(self, name):
+        if name.startswith('__'):
+            raise AttributeError(name)
+        child = _Struct()
+        setattr(self, name, child)
+        return child
+
+
+class _WidgetType(type):
+    def __getattr__(cls, name):
+        if name.startswith('__'):
+            raise AttributeError(name)
+        return _ns(cls.__name__ + '.' + name)
+
+
+class _Widget(metaclass=_WidgetType):
+    def __init__(self, parent=None, copy=None):
+        self._props = {'hidden': False, 'text': '', 'width': 240, 'height': 320, 'selected': 0}
+        self.calls = {}
+
+    def __getattr__(self, name):
+        if name.startswith('__') or name in ('_props', 'calls'):
+            raise AttributeError(name)
+        if name.isupper():
+            # constants reached through an instance, e.g. mbox.STYLE.BTN_REL
+            return getattr(type(self), name)
+        if name.startswith('set_'):
+            key = name[4:]
+
+            def setter(*args, **kwargs):
+                self.calls[name] = self.calls.get(name, 0) + 1
+                self._props[key] = args[0] if len(args) == 1 else args
+            return setter
+        if name.startswith('get_'):
+            key = name[4:]
+            return lambda *args: self._props.get(key, 0)
+
+        def method(*args, **kwargs):
+            self.calls[name] = self.calls.get(name, 0) + 1
+            return _Widget()
+        return method
+
+
+def _widget(name):
+    return _WidgetType(name, (_Widget,), {})
+
+
+for _name in ('obj', 'label', 'chart', 'line', 'cont', 'led', 'btn', 'ddlist', 'mbox', 'kb', 'ta'):
+    globals()[_name] = _widget(_name)
+
+
+class SYMBOL:
+    PLAY = '>'
+    STOP = '[]'
+    SETTINGS = '*'
+    PLUS = '+'
+
+
+class CHART_POINT:
+    DEF = -32768
+
+
+def style_t():
+    return _Struct()
+
+
+def style_copy(dst, src):
+    pass
+
+
+def color_make(r, g, b):
+    return (r, g, b)
+
+
+_screen = obj()
+
+
+def scr_act():
+    return _screen
+
+
+def scr_load(scr):
+    pass
+
+
+def __getattr__(name):
+    if name.startswith('__'):
+        raise AttributeError(name)
+    if name.startswith('style_') or name.startswith('font_'):
+        return _Struct()
+    return _ns(name)
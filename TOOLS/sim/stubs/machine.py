@@ -0,0 +1,147 @@
+"""
+machine stand-in: pins, SPI and timers on the virtual clock of simclock.
+The simulated hardware hooks in with watch_pin() and attach_spi_device().
+"""
+import simclock
+
+_spi_devices = {}  # cs pin id -> object with read(buf)
+_pin_listeners = {}  # pin id -> callable(level)
+_levels = {}  # pin id -> last driven level
+
+
+def watch_pin(pin_id, listener):
+    """
+    Call listener(level) whenever the pin is driven
+    """
+    _pin_listeners[pin_id] = listener
+
+
+def attach_spi_device(cs_pin_id, device):
+    """
+    device.read(buf) answers SPI reads while the cs pin is driven low
+    """
+    _spi_devices[cs_pin_id] = device
+
+
+def reset_hardware():
+    _spi_devices.clear()
+    _pin_listeners.clear()
+    _levels.clear()
+
+
+def freq(hz=None):
+    if hz is None:
+        return 240000000
+
+
+def reset():
+    raise SystemExit('machine.reset()')
+
+
+class Pin:
+    IN = 1
+    OUT = 3
+
+    def __init__(self, pin_id, mode=None, value=None):
+        self.id = pin_id
+        self._value = value or 0
+        _levels[pin_id] = _levels.get(pin_id, 1) if value is None else self._value
+
+    def value(self, value=None):
+        if value is None:
+            return self._value
+        self._value = 1 if value else 0
+        _levels[self.id] = self._value
+        listener = _pin_listeners.get(self.id)
+        if listener:
+            listener(self._value)
+
+    def on(self):
+        self.value(1)
+
+    def off(self):
+        self.value(0)
+
+
+class Signal:
+    def __init__(self, pin, invert=False):
+        self._pin = pin
+        self._invert = invert
+
+    def value(self, value=None):
+        if value is None:
+            return self._pin.value() ^ self._invert
+        self._pin.value(bool(value) ^ self._invert)
+
+    def on(self):
+        self.value(1)
+
+    def off(self):
+        self.value(0)
+
+
+class SPI:
+    def __init__(self, bus_id=-1, baudrate=0, sck=None, mosi=None, miso=None, **kwargs):
+        pass
+
+    def readinto(self, buf):
+        # the device whose CS pin is driven low answers
+        for cs_id, device in _spi_devices.items():
+            if _levels.get(cs_id) == 0:
+                device.read(buf)
+                return
+        for i in range(len(buf)):
+            buf[i] = 0xFF
+
+
+class PWM:
+    def __init__(self, pin, freq=0, duty=0):
+        self._freq = freq
+        self._duty = duty
+
+    def freq(self, value=None):
+        if value is None:
+            return self._freq
+        self._freq = value
+
+    def duty(self, value=None):
+        if value is None:
+            return self._duty
+        self._duty = value
+
+    def deinit(self):
+        pass
+
+
+class Timer:
+    ONE_SHOT = 0
+    PERIODIC = 1
+
+    def __init__(self, timer_id=-1):
+        self.id = timer_id
+        self._callback = None
+        self._period_us = 0
+        self._mode = Timer.ONE_SHOT
+        self._due = None
+
+    def init(self, period=0, mode=PERIODIC, callback=None, freq=None):
+        self._period_us = int(1000000 / freq) if freq else int(period) * 1000
+        self._mode = mode
+        self._callback = callback
+        self._due = simclock.now_us + self._period_us
+        simclock.add_timer(self._due, self)
+
+    def deinit(self):
+        self._due = None
+
+    def armed(self, due):
+        return self._due == due
+
+    def fire(self, due):
+        if self._mode == Timer.PERIODIC:
+            self._due = due + self._period_us
+            simclock.add_timer(self._due, self)
+        else:
+            self._due = None
+        if self._callback:
+            self._callback(self)
@@ -0,0 +1,14 @@
+"""micropython stand-in: schedule() queues onto the virtual clock of simclock"""
+import simclock
+
+
+def const(value):
+    return value
+
+
+def schedule(func, arg):
+    simclock.schedule(func, arg)
+
+
+def alloc_emergency_exception_buf(size):
+    pass
@@ -0,0 +1,2 @@
+"""uarray stand-in: the CPython array module"""
+from array import *  # noqa: F401,F403
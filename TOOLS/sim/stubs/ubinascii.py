@@ -0,0 +1,2 @@
+"""ubinascii stand-in: the CPython binascii module"""
+from binascii import *  # noqa: F401,F403
@@ -0,0 +1,2 @@
+"""ucollections stand-in: the CPython collections module"""
+from collections import *  # noqa: F401,F403
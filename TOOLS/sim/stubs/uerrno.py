@@ -0,0 +1,2 @@
+"""uerrno stand-in: the CPython errno module"""
+from errno import *  # noqa: F401,F403
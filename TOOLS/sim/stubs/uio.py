@@ -0,0 +1,2 @@
+"""uio stand-in: the CPython io module"""
+from io import *  # noqa: F401,F403
@@ -0,0 +1,2 @@
+"""ujson stand-in: the CPython json module"""
+from json import *  # noqa: F401,F403
@@ -0,0 +1,2 @@
+"""uos stand-in: the CPython os module"""
+from os import *  # noqa: F401,F403
@@ -0,0 +1,2 @@
+"""ustruct stand-in: the CPython struct module"""
+from struct import *  # noqa: F401,F403
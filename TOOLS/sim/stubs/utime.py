@@ -0,0 +1,41 @@
+"""utime stand-in on the virtual clock of simclock"""
+import simclock
+
+# ticks wrap around like the 30-bit small ints of the ESP32 port
+_PERIOD = 1 << 30
+
+
+def ticks_us():
+    return simclock.now() % _PERIOD
+
+
+def ticks_ms():
+    return (simclock.now() // 1000) % _PERIOD
+
+
+def ticks_cpu():
+    return ticks_us()
+
+
+def ticks_diff(new, old):
+    return ((new - old + _PERIOD // 2) % _PERIOD) - _PERIOD // 2
+
+
+def ticks_add(ticks, delta):
+    return (ticks + delta) % _PERIOD
+
+
+def time():
+    return simclock.now() // 1000000
+
+
+def sleep_ms(ms):
+    simclock.advance(int(ms) * 1000)
+
+
+def sleep_us(us):
+    simclock.advance(int(us))
+
+
+def sleep(sec):
+    simclock.advance(int(sec * 1000000))